@@ -0,0 +1,184 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+from fastapi.responses import JSONResponse
+
+
+class EndpointClass:
+    """Admission settings and counters for one class of endpoints"""
+
+    def __init__(self, name, limit, max_queue, max_wait, priority, shed_status=503):
+        self.name = name
+        self.limit = limit            # concurrent requests of this class
+        self.max_queue = max_queue    # waiters before new arrivals are shed outright
+        self.max_wait = max_wait      # seconds a waiter may queue before it is shed
+        self.priority = priority      # lower value is served first when a slot frees
+        self.shed_status = shed_status
+
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self.avg_service = 0.5        # EMA of handler time, seeds the wait prediction
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "avg_service_seconds": round(self.avg_service, 3),
+            "priority": self.priority,
+        }
+
+
+class Shed(Exception):
+    """Raised by acquire() when a request is rejected; carries the HTTP status and Retry-After"""
+
+    def __init__(self, status_code, retry_after, reason):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+# ------------------ Admission control ------------------
+class AdmissionController:
+    """
+    Per-class concurrency limits under a global cap, with a short bounded wait queue.
+
+    When a slot frees up, the waiting request with the best (priority, arrival) whose
+    class still has room is admitted, so interactive chat overtakes cosmetic TTS.
+    A new request is shed immediately when its queue is full or when the predicted
+    wait (queue depth x average service time / limit) already exceeds its max_wait;
+    queued requests that outlive max_wait are shed too. Shedding early keeps the
+    requests that are admitted fast, instead of everything timing out together.
+    """
+
+    def __init__(self, global_limit, classes):
+        self.global_limit = global_limit
+        self.classes = {c.name: c for c in classes}
+        self.in_flight = 0
+        self._waiters = []  # heap of (priority, seq, class, future)
+        self._seq = itertools.count()
+
+    def _has_room(self, cls) -> bool:
+        return self.in_flight < self.global_limit and cls.in_flight < cls.limit
+
+    def _retry_after(self, cls) -> int:
+        backlog = cls.queued + cls.in_flight
+        return max(1, math.ceil(backlog * cls.avg_service / max(cls.limit, 1)))
+
+    def _grant(self, cls):
+        self.in_flight += 1
+        cls.in_flight += 1
+        cls.admitted += 1
+
+    def _dispatch(self):
+        """Hand freed slots to the best waiters that fit"""
+        skipped = []
+        while self._waiters and self.in_flight < self.global_limit:
+            entry = heapq.heappop(self._waiters)
+            _, _, cls, future = entry
+            if future.done():
+                continue  # timed out / cancelled while queued
+            if cls.in_flight >= cls.limit:
+                skipped.append(entry)
+                continue
+            cls.queued -= 1
+            self._grant(cls)
+            future.set_result(True)
+        for entry in skipped:
+            heapq.heappush(self._waiters, entry)
+
+    def _higher_priority_waiting(self, cls) -> bool:
+        # waiters whose own class is at its limit can't take the slot, so don't defer to them
+        return any(
+            not f.done() and p <= cls.priority and self._has_room(waiting)
+            for p, _, waiting, f in self._waiters
+        )
+
+    def saturated(self, name) -> bool:
+        """True when a new request of this class would have to queue (or be shed)"""
+        cls = self.classes[name]
+        return cls.queued > 0 or not self._has_room(cls)
+
+    async def acquire(self, name):
+        cls = self.classes[name]
+        if self._has_room(cls) and not self._higher_priority_waiting(cls):
+            self._grant(cls)
+            return
+
+        predicted_wait = (cls.queued + 1) * cls.avg_service / max(cls.limit, 1)
+        if cls.queued >= cls.max_queue or predicted_wait > cls.max_wait:
+            cls.shed += 1
+            raise Shed(cls.shed_status, self._retry_after(cls), f"{name} overloaded, please retry")
+
+        future = asyncio.get_running_loop().create_future()
+        cls.queued += 1
+        heapq.heappush(self._waiters, (cls.priority, next(self._seq), cls, future))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=cls.max_wait)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return  # granted at the last moment
+            future.cancel()
+            cls.queued -= 1
+            cls.timed_out += 1
+            cls.shed += 1
+            raise Shed(cls.shed_status, self._retry_after(cls), f"{name} queue wait exceeded, please retry")
+        except asyncio.CancelledError:
+            # client went away while queued; give the slot back if we already got one
+            if future.done() and not future.cancelled():
+                self.release(name, 0.0)
+            else:
+                future.cancel()
+                cls.queued -= 1
+            raise
+
+    def release(self, name, service_seconds):
+        cls = self.classes[name]
+        self.in_flight -= 1
+        cls.in_flight -= 1
+        if service_seconds > 0:
+            cls.avg_service += 0.2 * (service_seconds - cls.avg_service)
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "global_limit": self.global_limit,
+            "in_flight": self.in_flight,
+            "classes": {name: cls.stats() for name, cls in self.classes.items()},
+        }
+
+
+def admission_middleware(controller, routes):
+    """
+    Build an http middleware that admits requests whose path is in routes ({path: class name})
+    and answers shed ones with status + Retry-After before any handler work happens.
+    """
+    async def middleware(request, call_next):
+        name = routes.get(request.url.path)
+        if name is None or request.method == "OPTIONS":
+            return await call_next(request)
+        try:
+            await controller.acquire(name)
+        except Shed as e:
+            return JSONResponse(
+                status_code=e.status_code,
+                content={"detail": e.reason},
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        started = time.perf_counter()
+        try:
+            return await call_next(request)
+        finally:
+            controller.release(name, time.perf_counter() - started)
+
+    return middleware
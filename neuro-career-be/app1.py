@@ -1,3 +1,4 @@
+import io
 import os
 import queue
 import threading
@@ -12,15 +13,27 @@ import assemblyai as aai
 import google.generativeai as genai
 from elevenlabs import ElevenLabs
 
+from audio_bank import AudioBank, STATIC_UTTERANCES
+from playback import StreamingPlayer
+from barge_in import BargeInDetector
+from endpointing import AdaptiveEndpointer, FixedEndpointer
+
 # ---------------- CONFIG ----------------
 ENV_PATH = r"C:\full_prototype\Neuro-Career\neuro-career-be\.env"   # change if needed
 SAMPLE_RATE = 16000
 BLOCKSIZE = 1024                        # input block size for sounddevice callback
 SILENCE_THRESHOLD = 0.01                # RMS threshold to consider "speech"
 SILENCE_DURATION = 0.7                  # seconds of silence to mark end of utterance
+MIN_SILENCE_DURATION = 0.3              # shortest tail the adaptive endpointer uses on clean audio
+ADAPTIVE_ENDPOINTING = True             # False restores the fixed RMS/SILENCE_DURATION rule
+SPECULATIVE_DISPATCH = True             # start transcription + Gemini at pause onset, before the endpoint
+SPECULATIVE_PAUSE = 0.2                 # seconds of silence that count as a pause onset
+SPECULATIVE_MAX_PER_UTTERANCE = 2       # cap on discarded Gemini calls for choppy speakers
 MIN_UTTERANCE_DURATION = 0.15           # ignore very short noises (< seconds)
 ELEVEN_VOICE_ID = "pNInz6obpgDQGcFmaJgB"
 ELEVEN_TTS_MODEL = "eleven_turbo_v2"
+ELEVEN_OUTPUT_FORMAT = "pcm_24000"      # raw 16-bit PCM so playback can start on the first chunk
+TTS_SAMPLE_RATE = 24000
 CUSTOM_PROMPT = """
 You are a prototype career counsellor chatbot named Lonita. 
 Your role is to help students explore career paths based on their basic background and preferences. 
@@ -63,6 +76,33 @@ aai.settings.api_key = ASSEMBLYAI_KEY
 genai.configure(api_key=GEMINI_KEY)
 eleven_client = ElevenLabs(api_key=ELEVEN_KEY)
 
+# Pre-rendered fixed utterances (python build_audio_bank.py); falls back to live TTS if missing
+audio_bank = AudioBank()
+audio_bank.load()
+
+# ---------------- SPECULATIVE TURNS ----------------
+class SpeculativeTurn:
+    """
+    Transcription + Gemini work started at a pause onset, before the endpoint is known.
+    The process loop later either commits it (the pause became an endpoint) or
+    cancels it (the user resumed speaking) and its result is thrown away.
+    """
+
+    def __init__(self, audio_np):
+        self.audio = audio_np
+        self.cancelled = threading.Event()
+        self.decided = threading.Event()
+        self.turn_id = None
+
+    def commit(self, turn_id):
+        self.turn_id = turn_id
+        self.decided.set()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.decided.set()
+
+
 # ---------------- ASSISTANT ----------------
 class AI_Assistant:
     def __init__(
@@ -70,13 +110,29 @@ class AI_Assistant:
         sample_rate=SAMPLE_RATE,
         blocksize=BLOCKSIZE,
         silence_threshold=SILENCE_THRESHOLD,
-        silence_duration=SILENCE_DURATION
+        silence_duration=SILENCE_DURATION,
+        adaptive_endpointing=ADAPTIVE_ENDPOINTING,
+        speculative_dispatch=SPECULATIVE_DISPATCH
     ):
         self.sample_rate = sample_rate
         self.blocksize = blocksize
         self.silence_threshold = silence_threshold
         self.silence_duration = silence_duration
 
+        # Decides where utterances start and end (see evaluate_endpointing.py for offline comparison)
+        if adaptive_endpointing:
+            self.endpointer = AdaptiveEndpointer(
+                sample_rate, min_tail=MIN_SILENCE_DURATION, max_tail=silence_duration
+            )
+        else:
+            self.endpointer = FixedEndpointer(sample_rate, silence_threshold, silence_duration)
+
+        # Speculative dispatch at pause onset (see SpeculativeTurn)
+        self.speculative_dispatch = speculative_dispatch
+        self.speculation = None
+        self.speculations_this_utterance = 0
+        self.speculation_stats = {"started": 0, "committed": 0, "cancelled": 0}
+
         self.audio_queue = queue.Queue()
         self.recording = False
         self.speaking = False
@@ -86,12 +142,19 @@ class AI_Assistant:
         # For generating responses
         self.model = genai.GenerativeModel("gemini-1.5-flash")
 
+        # Plays TTS audio as it streams in (no temp files)
+        self.player = StreamingPlayer(sample_rate=TTS_SAMPLE_RATE)
+
+        # Full duplex: keep listening while speaking and let the user interrupt
+        self.barge_in = BargeInDetector(sample_rate, speech_threshold=silence_threshold)
+        self.turn_lock = threading.Lock()
+        self.turn_id = 0                # bumped on every new utterance/barge-in; older turns are stale
+
     def _mic_callback(self, indata, frames, time_info, status):
         if status:
             print("InputStream status:", status)
-        # Drop incoming audio while assistant is playing to avoid echo-back
-        if self.speaking:
-            return
+        # Audio keeps flowing while the assistant speaks; _process_loop separates
+        # echo from real barge-in using the playback reference
         # copy to keep the numpy buffer valid
         self.audio_queue.put(indata.copy())
 
@@ -126,79 +189,140 @@ class AI_Assistant:
         # wait for processing thread
         if self.process_thread and self.process_thread.is_alive():
             self.process_thread.join(timeout=2.0)
+        if self.speculation_stats["started"]:
+            print("Speculative turns:", self.speculation_stats)
         print("Stopped listening.")
 
     def _process_loop(self):
         """
-        Read audio blocks from queue, use RMS to detect speech start/end.
+        Read audio blocks from queue, let the endpointer detect speech start/end.
         When speech segment detected, hand it off to handler thread.
         """
         buffer_blocks = []
-        speech_active = False
-        silence_time = 0.0
         last_time = time.time()
 
         while self.recording:
             try:
                 block = self.audio_queue.get(timeout=0.3)  # block: numpy array shape (n,1)
             except queue.Empty:
-                # if waiting and previously had some short speech, check silence timer
-                if speech_active:
-                    now = time.time()
-                    silence_time += now - last_time
-                    last_time = now
-                    if silence_time >= self.silence_duration:
-                        # finalize utterance
-                        audio_np = np.concatenate(buffer_blocks, axis=0)
-                        total_sec = audio_np.shape[0] / self.sample_rate
-                        buffer_blocks = []
-                        speech_active = False
-                        silence_time = 0.0
-                        if total_sec >= MIN_UTTERANCE_DURATION:
-                            threading.Thread(target=self._handle_utterance, args=(audio_np,), daemon=True).start()
-                        else:
-                            # ignore too-short capture
-                            pass
+                # no audio arriving: keep the silence timer running for an open utterance
+                now = time.time()
+                if self.endpointer.advance_silence(now - last_time):
+                    self._finalize_utterance(buffer_blocks)
+                    buffer_blocks = []
+                elif self.endpointer.speech_active:
+                    self._update_speculation(buffer_blocks)
+                last_time = now
                 continue
 
             # got a block
-            now = time.time()
-            last_time = now
-            # compute RMS energy
-            rms = np.sqrt(np.mean(np.square(block.astype("float32"))))
-            if rms >= self.silence_threshold:
-                # speech detected
+            last_time = time.time()
+
+            if self.speaking:
+                # while the assistant talks, only a confirmed barge-in counts as speech
+                if self.barge_in.update(block, self.player.output_rms()):
+                    print("\n[Barge-in detected, stopping playback]")
+                    self._cancel_current_turn()
+                    buffer_blocks = self.barge_in.take_preroll()
+                    self.endpointer.force_speech()
+                continue
+            self.barge_in.reset()
+
+            event = self.endpointer.process(block)
+            if self.endpointer.speech_active or event == "end":
                 buffer_blocks.append(block)
-                speech_active = True
-                silence_time = 0.0
-            else:
-                # below threshold
-                if speech_active:
-                    buffer_blocks.append(block)
-                    # accumulate silence
-                    silence_time += block.shape[0] / self.sample_rate
-                    if silence_time >= self.silence_duration:
-                        # finalize
-                        audio_np = np.concatenate(buffer_blocks, axis=0)
-                        total_sec = audio_np.shape[0] / self.sample_rate
-                        buffer_blocks = []
-                        speech_active = False
-                        silence_time = 0.0
-                        if total_sec >= MIN_UTTERANCE_DURATION:
-                            threading.Thread(target=self._handle_utterance, args=(audio_np,), daemon=True).start()
-                        else:
-                            # noise only
-                            pass
-                else:
-                    # not in speech, drop silent block (keeps memory small)
-                    pass
+            if event == "end":
+                self._finalize_utterance(buffer_blocks)
+                buffer_blocks = []
+            elif self.endpointer.speech_active:
+                self._update_speculation(buffer_blocks)
+            # outside speech, silent blocks are dropped (keeps memory small)
 
         # on exit, flush any buffered speech
         if buffer_blocks:
+            self._finalize_utterance(buffer_blocks)
+
+    def _update_speculation(self, buffer_blocks):
+        """Start speculative work at a pause onset; discard it if the user keeps talking"""
+        if not self.speculative_dispatch:
+            return
+        if self.endpointer.silence_time == 0.0:
+            # speech resumed: whatever we guessed from the partial audio is stale
+            if self.speculation is not None:
+                self.speculation.cancel()
+                self.speculation = None
+                self.speculation_stats["cancelled"] += 1
+                print("[Speech resumed, speculative turn discarded]")
+            return
+        if (
+            self.speculation is None
+            and self.endpointer.silence_time >= SPECULATIVE_PAUSE
+            and self.speculations_this_utterance < SPECULATIVE_MAX_PER_UTTERANCE
+            and buffer_blocks
+        ):
             audio_np = np.concatenate(buffer_blocks, axis=0)
-            if audio_np.shape[0] / self.sample_rate >= MIN_UTTERANCE_DURATION:
-                threading.Thread(target=self._handle_utterance, args=(audio_np,), daemon=True).start()
+            if audio_np.shape[0] / self.sample_rate < MIN_UTTERANCE_DURATION:
+                return
+            self.speculation = SpeculativeTurn(audio_np)
+            self.speculations_this_utterance += 1
+            self.speculation_stats["started"] += 1
+            threading.Thread(target=self._run_speculation, args=(self.speculation,), daemon=True).start()
+
+    def _finalize_utterance(self, buffer_blocks):
+        self.speculations_this_utterance = 0
+        if self.speculation is not None:
+            # the pause became a real endpoint: keep the already-running work
+            # (only silence was captured after it started, so its audio is complete)
+            speculation = self.speculation
+            self.speculation = None
+            with self.turn_lock:
+                self.turn_id += 1
+                turn_id = self.turn_id
+            self.speculation_stats["committed"] += 1
+            speculation.commit(turn_id)
+            return
+        if not buffer_blocks:
+            return
+        audio_np = np.concatenate(buffer_blocks, axis=0)
+        total_sec = audio_np.shape[0] / self.sample_rate
+        if total_sec >= MIN_UTTERANCE_DURATION:
+            self._start_turn(audio_np)
+        # else: noise only, ignore too-short capture
+
+    def _start_turn(self, audio_np):
+        """Hand a finished utterance to a handler thread; any older in-flight turn becomes stale"""
+        with self.turn_lock:
+            self.turn_id += 1
+            turn_id = self.turn_id
+        threading.Thread(target=self._handle_utterance, args=(audio_np, turn_id), daemon=True).start()
+
+    def _cancel_current_turn(self):
+        """Barge-in: stop playback now and invalidate in-flight transcription/Gemini/TTS work"""
+        with self.turn_lock:
+            self.turn_id += 1
+        if self.speculation is not None:
+            self.speculation.cancel()
+            self.speculation = None
+        self.player.stop()
+        self.speaking = False
+
+    def _is_stale(self, turn_id):
+        return turn_id is not None and turn_id != self.turn_id
 
+    def _until_stale(self, chunk_iter, turn_id):
+        """Pass TTS chunks through until the turn is superseded, then close the provider stream"""
+        try:
+            for chunk in chunk_iter:
+                if self._is_stale(turn_id):
+                    break
+                yield chunk
+        finally:
+            close = getattr(chunk_iter, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
 
     def process_new_answer(slot, value):
         state[slot] = value
@@ -209,11 +333,8 @@ class AI_Assistant:
         prompt += "Which of the required pieces of information is missing? Ask only one at a time, and do NOT repeat questions for fields already filled."
         return prompt
 
-    def _handle_utterance(self, audio_np):
-        """
-        Save audio to temp wav, call AssemblyAI for transcription,
-        call Gemini for reply, then TTS+playback.
-        """
+    def _transcribe(self, audio_np):
+        """Save audio to temp wav and transcribe it with AssemblyAI; returns text or None"""
         # Save wav
         try:
             with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tf:
@@ -221,7 +342,7 @@ class AI_Assistant:
             sf.write(wav_path, audio_np, self.sample_rate, subtype="PCM_16")
         except Exception as e:
             print("Error saving WAV:", e)
-            return
+            return None
 
         # Transcribe (AssemblyAI - synchronous batch)
         transcript = None
@@ -237,112 +358,126 @@ class AI_Assistant:
             os.remove(wav_path)
         except Exception:
             pass
+        return transcript
+
+    def _generate_reply(self, transcript):
+        """Ask Gemini for the reply to transcript"""
+        try:
+            full_prompt = CUSTOM_PROMPT.format(user_input=transcript)
+            resp = self.model.generate_content(full_prompt)
+            return resp.text.strip() if getattr(resp, "text", None) else None
+        except Exception as e:
+            print("Gemini error:", e)
+            return STATIC_UTTERANCES["fallback_no_reply"]
+
+    def _handle_utterance(self, audio_np, turn_id=None):
+        """
+        Save audio to temp wav, call AssemblyAI for transcription,
+        call Gemini for reply, then TTS+playback.
+        Bails out between stages once turn_id has been superseded by a newer turn.
+        """
+        transcript = self._transcribe(audio_np)
 
         if not transcript:
             print("[No speech recognized / transcription empty]")
             return
 
+        if self._is_stale(turn_id):
+            print("[Turn superseded, discarding transcript]")
+            return
+
         print("\nUser:", transcript)
 
         # Generate AI reply (Gemini)
-        try:
-            full_prompt = CUSTOM_PROMPT.format(user_input=transcript)
-            resp = self.model.generate_content(full_prompt)
-            ai_reply = resp.text.strip() if getattr(resp, "text", None) else None
-        except Exception as e:
-            print("Gemini error:", e)
-            ai_reply = "Sorry, I couldn't produce an answer right now."
+        ai_reply = self._generate_reply(transcript)
 
         if not ai_reply:
             print("[No AI reply]")
             return
 
+        if self._is_stale(turn_id):
+            # Gemini calls can't be aborted mid-request; drop the stale result instead
+            print("[Turn superseded, discarding reply]")
+            return
+
         print("Assistant:", ai_reply)
 
-        # Generate TTS and play (pause listening during playback)
+        self._speak(ai_reply, turn_id)
+
+    def _run_speculation(self, speculation):
+        """
+        Transcribe + generate on the audio captured up to the pause, then wait for the
+        process loop to commit or cancel. Only a committed turn is printed and spoken.
+        """
+        transcript = self._transcribe(speculation.audio)
+        ai_reply = None
+        if transcript and not speculation.cancelled.is_set():
+            ai_reply = self._generate_reply(transcript)
+
+        speculation.decided.wait()
+        if speculation.cancelled.is_set() or self._is_stale(speculation.turn_id):
+            return
+
+        if not transcript:
+            print("[No speech recognized / transcription empty]")
+            return
+        print("\nUser:", transcript)
+        if not ai_reply:
+            print("[No AI reply]")
+            return
+        print("Assistant:", ai_reply)
+        self._speak(ai_reply, speculation.turn_id)
+
+    def _speak(self, text, turn_id=None):
+        """
+        Speak text (pause listening during playback). Fixed utterances come from the
+        pre-rendered audio bank; anything else is streamed from ElevenLabs as PCM and
+        played while it is still being synthesized.
+        """
+        clip = None
+        if audio_bank.matches(ELEVEN_VOICE_ID, ELEVEN_TTS_MODEL):
+            clip = audio_bank.lookup_text(text)
+
+        if self._is_stale(turn_id):
+            return
         try:
+            self.barge_in.reset()
             self.speaking = True
-            audio_iter = eleven_client.text_to_speech.convert(
-                voice_id=ELEVEN_VOICE_ID,
-                model_id=ELEVEN_TTS_MODEL,
-                text=ai_reply
-            )
+            if clip is not None:
+                try:
+                    data, sr = sf.read(io.BytesIO(clip), dtype="float32")
+                    # through the player so bank clips are interruptible as well
+                    self.player.play_samples(data, sr)
+                    return
+                except Exception as e:
+                    print("Audio bank playback failed, synthesizing instead:", e)
 
-            # write to temp WAV file
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tf_out:
-                out_path = tf_out.name
-                for chunk in audio_iter:
-                    if chunk:
-                        tf_out.write(chunk)
-            # attempt to read & play via sounddevice
             try:
-                data, sr = sf.read(out_path, dtype="float32")
-                sd.play(data, sr)
-                sd.wait()
+                audio_iter = eleven_client.text_to_speech.convert(
+                    voice_id=ELEVEN_VOICE_ID,
+                    model_id=ELEVEN_TTS_MODEL,
+                    text=text,
+                    output_format=ELEVEN_OUTPUT_FORMAT
+                )
+                # decode + play each chunk as it arrives
+                self.player.play(self._until_stale(audio_iter, turn_id))
+                if self.player.first_audio_latency is not None:
+                    print(f"[TTS first audio after {self.player.first_audio_latency:.2f}s, "
+                          f"{self.player.underruns} underruns]")
             except Exception as e:
-                # fallback: on Windows try os.startfile (non-blocking)
-                print("Direct playback failed, falling back to OS player:", e)
-                try:
-                    if os.name == "nt":
-                        os.startfile(out_path)
-                        # wait heuristically until file finishes: play length from soundfile if available
-                        try:
-                            info = sf.info(out_path)
-                            wait_secs = info.duration if info.duration else 0
-                            time.sleep(wait_secs + 0.3)
-                        except Exception:
-                            time.sleep(1.0)
-                    else:
-                        print("Please play the file manually:", out_path)
-                        time.sleep(1.0)
-                except Exception as e2:
-                    print("Fallback playback also failed:", e2)
-            # cleanup tts file
-            try:
-                os.remove(out_path)
-            except Exception:
-                pass
+                print("TTS playback error:", e)
         finally:
-            self.speaking = False
+            # a barge-in may already have handed the floor to a newer turn
+            if not self._is_stale(turn_id):
+                self.speaking = False
 
 # ---------------- MAIN ----------------
 if __name__ == "__main__":
     assistant = AI_Assistant()
     try:
-        greeting = (
-            "Hey there! Wonderful to have another enthusiast ready to explore the VR world of careers. "
-            "My name is Lonita and I help analyze aptitudes to suggest career paths. Say 'yes' when you are ready."
-        )
-        # speak greeting synchronously
-        # reuse same handler for TTS playback
-        assistant._handle_utterance(np.zeros((int(SAMPLE_RATE*0.2),1), dtype="float32"))  # quick trick to create temp file path (not needed)
-        # Instead of artificial call, directly generate greeting TTS:
-        assistant.speaking = True
-        audio_iter = eleven_client.text_to_speech.convert(
-            voice_id=ELEVEN_VOICE_ID, model_id=ELEVEN_TTS_MODEL, text=greeting
-        )
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tf:
-            out_path = tf.name
-            for chunk in audio_iter:
-                if chunk:
-                    tf.write(chunk)
-        try:
-            data, sr = sf.read(out_path, dtype="float32")
-            sd.play(data, sr)
-            sd.wait()
-        except Exception:
-            try:
-                if os.name == "nt":
-                    os.startfile(out_path)
-                    # wait short time
-                    time.sleep(1.0)
-            except Exception:
-                pass
-        try:
-            os.remove(out_path)
-        except Exception:
-            pass
-        assistant.speaking = False
+        greeting = STATIC_UTTERANCES["greeting"]
+        # speak greeting synchronously (served from the audio bank when it has been built)
+        assistant._speak(greeting)
 
         # start continuous listening
         assistant.start_listening()
@@ -0,0 +1,205 @@
+"""
+Append-only log of assessment progress.
+
+The request path only appends an event to an in-memory queue; a background task
+flushes queued events in batches as compact JSON lines to the active segment file
+(assessments-<timestamp>.jsonl). Segments are rotated by size or age and rotated
+segments are gzip-compressed. read_events() / read_assessments() stream everything
+back for analytics, and running this module prints completed assessments as CSV:
+
+    python assessment_log.py [log_dir] > assessments.csv
+"""
+import argparse
+import asyncio
+import csv
+import glob
+import gzip
+import json
+import os
+import shutil
+import sys
+import time
+from collections import deque
+
+SEGMENT_PREFIX = "assessments-"
+SEGMENT_STAMP = "%Y%m%d-%H%M%S"
+
+
+def segment_order(path):
+    """
+    (creation time, sequence) parsed from a segment name, assessments-<stamp>[-<n>].jsonl[.gz].
+    Names that don't parse fall back to the file's mtime.
+    """
+    name = os.path.basename(path)[len(SEGMENT_PREFIX):]
+    name = name[:-len(".gz")] if name.endswith(".gz") else name
+    name = name[:-len(".jsonl")] if name.endswith(".jsonl") else name
+    parts = name.split("-")
+    try:
+        created = time.mktime(time.strptime("-".join(parts[:2]), SEGMENT_STAMP))
+        sequence = int(parts[2]) if len(parts) > 2 else 0
+    except (ValueError, OverflowError):
+        return os.path.getmtime(path), 0
+    return created, sequence
+
+
+class AssessmentLog:
+    def __init__(self, directory, flush_interval=1.0, max_batch=1000, rotate_bytes=8 * 1024 * 1024,
+                 rotate_seconds=24 * 3600, max_queue=100_000):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self._queue = deque(maxlen=max_queue)  # append/popleft are atomic, no lock on the request path
+        self._segment = None
+        self._segment_opened = 0.0
+        self._task = None
+
+        self.enqueued = 0
+        self.written = 0
+        self.flushes = 0
+        self.rotations = 0
+        self.write_errors = 0
+
+    # ---- request path ----
+    def record(self, event_type, session_id, **fields):
+        """Queue one event; costs a dict and a deque append"""
+        if len(self._queue) == self._queue.maxlen:
+            print("Assessment log queue full, dropping oldest event")
+        self._queue.append({"ts": round(time.time(), 3), "type": event_type, "session_id": session_id, **fields})
+        self.enqueued += 1
+
+    # ---- background flushing ----
+    def _segment_path(self):
+        if self._segment is None:
+            os.makedirs(self.directory, exist_ok=True)
+            existing = sorted(glob.glob(os.path.join(self.directory, f"{SEGMENT_PREFIX}*.jsonl")), key=segment_order)
+            if existing:
+                # resume the newest uncompressed segment after a restart; its age counts from
+                # the creation time in its name, since every append moves the mtime
+                self._segment = existing[-1]
+                self._segment_opened = segment_order(self._segment)[0]
+            else:
+                self._open_segment()
+        return self._segment
+
+    def _open_segment(self):
+        stamp = time.strftime(SEGMENT_STAMP)
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{stamp}.jsonl")
+        suffix = 1
+        while os.path.exists(path) or os.path.exists(path + ".gz"):
+            path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{stamp}-{suffix}.jsonl")
+            suffix += 1
+        self._segment = path
+        self._segment_opened = time.time()
+
+    def _rotate_if_due(self):
+        path = self._segment_path()
+        too_big = os.path.exists(path) and os.path.getsize(path) >= self.rotate_bytes
+        too_old = time.time() - self._segment_opened >= self.rotate_seconds
+        if not (too_big or too_old) or not os.path.exists(path):
+            return
+        with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+        self.rotations += 1
+        self._open_segment()
+
+    def _write_batch(self, lines):
+        """Blocking: runs in a worker thread"""
+        self._rotate_if_due()
+        with open(self._segment_path(), "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+
+    async def flush(self):
+        while self._queue:
+            batch = []
+            while self._queue and len(batch) < self.max_batch:
+                batch.append(self._queue.popleft())
+            lines = [json.dumps(event, separators=(",", ":"), default=str) + "\n" for event in batch]
+            try:
+                await asyncio.to_thread(self._write_batch, lines)
+            except OSError as e:
+                # put the batch back in order and retry on the next tick
+                self.write_errors += 1
+                self._queue.extendleft(reversed(batch))
+                print(f"Assessment log flush failed: {e}")
+                return
+            self.written += len(batch)
+            self.flushes += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        """Call from inside the running loop (app startup)"""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "directory": self.directory,
+            "active_segment": self._segment,
+            "queued": len(self._queue),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "flushes": self.flushes,
+            "rotations": self.rotations,
+            "write_errors": self.write_errors,
+        }
+
+
+# ------------------ Bulk reading ------------------
+def read_events(directory, event_types=None, since=None):
+    """Yield every logged event in write order, across rotated (.gz) and active segments"""
+    segments = glob.glob(os.path.join(directory, f"{SEGMENT_PREFIX}*.jsonl")) + \
+        glob.glob(os.path.join(directory, f"{SEGMENT_PREFIX}*.jsonl.gz"))
+    for path in sorted(segments, key=segment_order):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash mid-write
+                if event_types and event.get("type") not in event_types:
+                    continue
+                if since is not None and event.get("ts", 0) < since:
+                    continue
+                yield event
+
+
+def read_assessments(directory, since=None):
+    """Completed assessments as flat dicts: ts, session_id and one key per slot"""
+    for event in read_events(directory, event_types={"completed"}, since=since):
+        yield {"ts": event["ts"], "session_id": event["session_id"], **event.get("state", {})}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export completed assessments as CSV")
+    parser.add_argument("directory", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "assessment_log"))
+    parser.add_argument("--since", type=float, default=None, help="only events at/after this unix timestamp")
+    args = parser.parse_args()
+
+    rows = list(read_assessments(args.directory, since=args.since))
+    if not rows:
+        print("No completed assessments found", file=sys.stderr)
+        return
+    fields = list(dict.fromkeys(key for row in rows for key in row))
+    writer = csv.DictWriter(sys.stdout, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
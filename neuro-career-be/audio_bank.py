@@ -0,0 +1,156 @@
+import json
+import mmap
+import os
+import struct
+
+# ------------------ Static utterances ------------------
+# Every fixed line the assistant speaks. These are pre-rendered into the audio bank by
+# build_audio_bank.py, so keep the text here as the single source of truth.
+STATIC_UTTERANCES = {
+    "greeting": (
+        "Hey there! Wonderful to have another enthusiast ready to explore the VR world of careers. "
+        "My name is Lonita and I help analyze aptitudes to suggest career paths. Say 'yes' when you are ready."
+    ),
+    "fallback_intro": (
+        "I'm here to help with your career exploration. Could you tell me a bit about yourself "
+        "(age, class, interests, skills, constraints, values, prior exploration)?"
+    ),
+    "fallback_error": "I apologize, but I'm having trouble responding right now. Could you please try again?",
+    "fallback_no_reply": "Sorry, I couldn't produce an answer right now.",
+}
+
+BANK_MAGIC = b"NCAB"
+BANK_VERSION = 1
+# magic, version, index length
+_HEADER = struct.Struct("<4sHI")
+DEFAULT_BANK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio_bank.bin")
+
+
+def _text_key(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def write_bank(path, clips: dict, output_format: str, voice_id: str, model_id: str):
+    """
+    Pack pre-rendered clips into one bank file.
+
+    clips: {key: (text, audio_bytes)}. Layout is a fixed header, a JSON index
+    ({key: {text, offset, length}} with offsets relative to the payload start),
+    then the concatenated audio payload.
+    """
+    index = {
+        "format": output_format,
+        "voice_id": voice_id,
+        "model_id": model_id,
+        "clips": {},
+    }
+    offset = 0
+    for key, (text, audio) in clips.items():
+        index["clips"][key] = {"text": text, "offset": offset, "length": len(audio)}
+        offset += len(audio)
+
+    index_bytes = json.dumps(index, ensure_ascii=False).encode("utf-8")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(BANK_MAGIC, BANK_VERSION, len(index_bytes)))
+        f.write(index_bytes)
+        for _, audio in clips.values():
+            f.write(audio)
+    # atomic swap so a running server never maps a half-written bank
+    os.replace(tmp_path, path)
+
+
+# ------------------ Audio bank ------------------
+class AudioBank:
+    """
+    Read-only, memory-mapped bank of pre-rendered utterances.
+
+    Clips are returned as memoryview slices into the mapping, so a lookup reads only
+    that clip's pages and the bank is never loaded into memory as a whole. HTTP
+    responses still copy the clip once into bytes (Starlette's Response needs bytes).
+    """
+
+    def __init__(self, path=DEFAULT_BANK_PATH):
+        self.path = path
+        self.format = None
+        self.voice_id = None
+        self.model_id = None
+        self._file = None
+        self._mmap = None
+        self._view = None
+        self._clips = {}    # key -> (offset, length)
+        self._by_text = {}  # normalized text -> key
+        self.hits = 0
+        self.bytes_served = 0
+
+    def load(self) -> bool:
+        """Map the bank file; returns False (and stays empty) if it is missing or invalid"""
+        if not os.path.exists(self.path):
+            print(f"Audio bank not found at {self.path}; static utterances will be synthesized")
+            return False
+        try:
+            self._file = open(self.path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, index_len = _HEADER.unpack_from(self._mmap, 0)
+            if magic != BANK_MAGIC or version != BANK_VERSION:
+                raise ValueError(f"unsupported bank header {magic!r} v{version}")
+            index_start = _HEADER.size
+            payload_start = index_start + index_len
+            index = json.loads(self._mmap[index_start:payload_start].decode("utf-8"))
+
+            self._view = memoryview(self._mmap)
+            self.format = index.get("format")
+            self.voice_id = index.get("voice_id")
+            self.model_id = index.get("model_id")
+            for key, clip in index.get("clips", {}).items():
+                start = payload_start + clip["offset"]
+                if start + clip["length"] > len(self._mmap):
+                    raise ValueError(f"clip {key} runs past end of bank")
+                self._clips[key] = (start, clip["length"])
+                self._by_text[_text_key(clip["text"])] = key
+            print(f"Loaded audio bank with {len(self._clips)} clips ({len(self._mmap)} bytes)")
+            return True
+        except Exception as e:
+            print(f"Failed to load audio bank {self.path}: {e}")
+            self.close()
+            return False
+
+    def matches(self, voice_id: str, model_id: str) -> bool:
+        """Only serve clips rendered with the voice/model currently configured"""
+        return self.voice_id == voice_id and self.model_id == model_id
+
+    def get(self, key: str):
+        clip = self._clips.get(key)
+        if clip is None or self._view is None:
+            return None
+        start, length = clip
+        self.hits += 1
+        self.bytes_served += length
+        return self._view[start:start + length]
+
+    def lookup_text(self, text: str):
+        """Return the clip whose source text equals text (whitespace-insensitive), or None"""
+        key = self._by_text.get(_text_key(text))
+        return self.get(key) if key else None
+
+    def close(self):
+        self._clips = {}
+        self._by_text = {}
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self._view is not None,
+            "clips": len(self._clips),
+            "format": self.format,
+            "hits": self.hits,
+            "bytes_served": self.bytes_served,
+        }
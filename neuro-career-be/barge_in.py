@@ -0,0 +1,72 @@
+from collections import deque
+
+import numpy as np
+
+
+# ------------------ Barge-in detection ------------------
+class BargeInDetector:
+    """
+    Decides whether microphone input during playback is the user talking over the
+    assistant or just the assistant's own voice leaking back in.
+
+    The known playback level (StreamingPlayer.output_rms) is the reference: the
+    detector learns the speaker-to-mic coupling gain while only echo is present,
+    and flags barge-in when the mic level stays well above the expected echo for
+    min_speech_ms. The blocks that confirmed it are kept as pre-roll so the start
+    of the interruption is not lost.
+    """
+
+    def __init__(
+        self,
+        sample_rate,
+        speech_threshold=0.01,
+        echo_margin=3.0,
+        min_speech_ms=200,
+        initial_coupling=0.5,
+        coupling_alpha=0.1,
+    ):
+        self.sample_rate = sample_rate
+        self.speech_threshold = speech_threshold
+        self.echo_margin = echo_margin
+        self.min_speech_sec = min_speech_ms / 1000
+        self.initial_coupling = initial_coupling
+        self.coupling_alpha = coupling_alpha
+
+        self.coupling = initial_coupling
+        self.preroll = deque()
+        self._speech_sec = 0.0
+
+        self.detections = 0
+        self.rejected_echo_blocks = 0
+
+    def reset(self):
+        """Start of a new playback: forget the candidate, keep the learned coupling"""
+        self.preroll.clear()
+        self._speech_sec = 0.0
+
+    def update(self, block, reference_rms) -> bool:
+        """Feed one mic block captured during playback; True once barge-in is confirmed"""
+        mic_rms = float(np.sqrt(np.mean(np.square(block.astype("float32")))))
+        expected_echo = self.coupling * reference_rms
+        detect_level = max(self.speech_threshold, self.echo_margin * expected_echo)
+
+        if mic_rms >= detect_level:
+            self.preroll.append(block)
+            self._speech_sec += block.shape[0] / self.sample_rate
+            if self._speech_sec >= self.min_speech_sec:
+                self.detections += 1
+                return True
+            return False
+
+        # only echo (or silence): adapt the coupling estimate and drop the candidate
+        if reference_rms > 1e-4:
+            observed = mic_rms / reference_rms
+            self.coupling += self.coupling_alpha * (observed - self.coupling)
+            self.rejected_echo_blocks += 1
+        self.reset()
+        return False
+
+    def take_preroll(self) -> list:
+        blocks = list(self.preroll)
+        self.reset()
+        return blocks
@@ -0,0 +1,54 @@
+"""
+Pre-render every static utterance into a single packed audio bank.
+
+Usage:
+    python build_audio_bank.py [--out audio_bank.bin]
+
+Re-run whenever STATIC_UTTERANCES, the voice or the TTS model changes. The server
+memory-maps the bank at startup and serves these clips without calling ElevenLabs.
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+from elevenlabs import ElevenLabs
+
+from audio_bank import DEFAULT_BANK_PATH, STATIC_UTTERANCES, write_bank
+
+ELEVEN_VOICE_ID = "pNInz6obpgDQGcFmaJgB"
+ELEVEN_TTS_MODEL = "eleven_turbo_v2"
+OUTPUT_FORMAT = "mp3_44100_128"  # ElevenLabs default, what /api/text-to-speech serves
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render static utterances into an audio bank")
+    parser.add_argument("--out", default=DEFAULT_BANK_PATH, help="bank file to write")
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path=".env")
+    eleven_key = os.getenv("ELEVENLABS_API_KEY")
+    if not eleven_key:
+        raise RuntimeError("Missing ELEVENLABS_API_KEY in .env")
+    client = ElevenLabs(api_key=eleven_key)
+
+    clips = {}
+    for key, text in STATIC_UTTERANCES.items():
+        print(f"Rendering {key}: {text[:60]}...")
+        audio_iter = client.text_to_speech.convert(
+            voice_id=ELEVEN_VOICE_ID,
+            model_id=ELEVEN_TTS_MODEL,
+            text=text,
+            output_format=OUTPUT_FORMAT,
+        )
+        audio = b"".join(chunk for chunk in audio_iter if isinstance(chunk, (bytes, bytearray)))
+        if not audio:
+            raise RuntimeError(f"ElevenLabs returned no audio for {key}")
+        clips[key] = (text, audio)
+
+    write_bank(args.out, clips, OUTPUT_FORMAT, ELEVEN_VOICE_ID, ELEVEN_TTS_MODEL)
+    total = sum(len(audio) for _, audio in clips.values())
+    print(f"Wrote {len(clips)} clips ({total} bytes of audio) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for budgeting"""
+    if not text:
+        return 0
+    return max(1, math.ceil(len(text) / 4))
+
+
+# ------------------ Conversation memory ------------------
+class ConversationMemory:
+    """
+    Rolling window of recent turns kept under a fixed token budget.
+
+    When the window overflows, the oldest turns are folded into a compact running
+    summary (clipped snippets of each turn, itself capped at summary_budget tokens),
+    so the history block added to the prompt never grows past
+    turn_budget + summary_budget tokens no matter how long the session runs.
+    """
+
+    def __init__(self, turn_budget=600, summary_budget=150, snippet_words=12):
+        self.turn_budget = turn_budget
+        self.summary_budget = summary_budget
+        self.snippet_words = snippet_words
+
+        self.turns = deque()  # (role, text, tokens)
+        self.turn_tokens = 0
+        self.summary_parts = deque()  # (snippet, tokens)
+        self.summary_tokens = 0
+
+        self.total_turns = 0
+        self.folded_turns = 0
+        self.last_used = time.monotonic()
+
+    def add_turn(self, role: str, text: str):
+        text = (text or "").strip()
+        if not text:
+            return
+        # a single huge turn is clipped so it can never blow the window on its own
+        max_chars = self.turn_budget * 4
+        if len(text) > max_chars:
+            text = text[:max_chars].rstrip() + "..."
+        tokens = estimate_tokens(f"{role}: {text}")
+        self.turns.append((role, text, tokens))
+        self.turn_tokens += tokens
+        self.total_turns += 1
+        self.last_used = time.monotonic()
+
+        while self.turn_tokens > self.turn_budget and len(self.turns) > 1:
+            self._fold_oldest()
+
+    def _fold_oldest(self):
+        role, text, tokens = self.turns.popleft()
+        self.turn_tokens -= tokens
+        self.folded_turns += 1
+
+        words = text.split()
+        snippet = " ".join(words[:self.snippet_words])
+        if len(words) > self.snippet_words:
+            snippet += "..."
+        snippet = f"{role}: {snippet}"
+        snippet_tokens = estimate_tokens(snippet)
+        self.summary_parts.append((snippet, snippet_tokens))
+        self.summary_tokens += snippet_tokens
+
+        while self.summary_tokens > self.summary_budget and self.summary_parts:
+            _, dropped = self.summary_parts.popleft()
+            self.summary_tokens -= dropped
+
+    def render(self) -> str:
+        """History block for the prompt; empty string when there is no history yet"""
+        # snapshot first: render() runs on worker threads while the handler appends turns
+        turns = list(self.turns)
+        summary_parts = list(self.summary_parts)
+        if not turns and not summary_parts:
+            return ""
+        lines = []
+        if summary_parts:
+            lines.append("Summary of earlier conversation:")
+            lines.append(" | ".join(snippet for snippet, _ in summary_parts))
+        if turns:
+            lines.append("Recent conversation:")
+            for role, text, _ in turns:
+                lines.append(f"{role}: {text}")
+        return "\n".join(lines)
+
+    def prompt_tokens(self) -> int:
+        return self.turn_tokens + self.summary_tokens
+
+    def stats(self) -> dict:
+        return {
+            "turns_in_window": len(self.turns),
+            "window_tokens": self.turn_tokens,
+            "summary_tokens": self.summary_tokens,
+            "prompt_tokens": self.prompt_tokens(),
+            "total_turns": self.total_turns,
+            "folded_turns": self.folded_turns,
+        }
+
+
+class SessionMemoryStore:
+    """Per-session ConversationMemory instances, bounded in count and idle time"""
+
+    def __init__(self, max_sessions=500, idle_ttl_seconds=3600, **memory_kwargs):
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.memory_kwargs = memory_kwargs
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> ConversationMemory:
+        now = time.monotonic()
+        with self._lock:
+            # drop idle sessions from the cold end
+            while self._sessions:
+                oldest_id, oldest = next(iter(self._sessions.items()))
+                if now - oldest.last_used < self.idle_ttl_seconds:
+                    break
+                del self._sessions[oldest_id]
+
+            memory = self._sessions.get(session_id)
+            if memory is None:
+                memory = ConversationMemory(**self.memory_kwargs)
+                self._sessions[session_id] = memory
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session_id)
+            memory.last_used = now
+            return memory
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
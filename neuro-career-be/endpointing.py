@@ -0,0 +1,161 @@
+import math
+
+import numpy as np
+
+
+# ------------------ Per-block features ------------------
+def block_features(frames, sample_rate):
+    """
+    Vectorized features for a batch of blocks.
+
+    frames: array of shape (n_blocks, blocksize) or a single (blocksize,) / (blocksize, 1) block.
+    Returns a dict of arrays, one value per block:
+      - rms:         signal level
+      - zcr:         zero-crossing rate (high for hiss/fricative noise, low for hum)
+      - flatness:    spectral flatness, ~1 for white noise, well below for voiced speech
+      - speech_band: share of energy in the 80-4000 Hz voice band (F0 through formants)
+    """
+    frames = np.asarray(frames, dtype="float32")
+    if frames.ndim == 1:
+        frames = frames[np.newaxis, :]
+    elif frames.ndim == 2 and frames.shape[1] == 1:
+        frames = frames.T
+    blocksize = frames.shape[1]
+
+    rms = np.sqrt(np.mean(np.square(frames), axis=1))
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(blocksize), axis=1)) ** 2 + 1e-12
+    flatness = np.exp(np.mean(np.log(spectrum), axis=1)) / np.mean(spectrum, axis=1)
+    freqs = np.fft.rfftfreq(blocksize, d=1.0 / sample_rate)
+    band = (freqs >= 80) & (freqs <= 4000)
+    speech_band = spectrum[:, band].sum(axis=1) / spectrum.sum(axis=1)
+
+    return {"rms": rms, "zcr": zcr, "flatness": flatness, "speech_band": speech_band}
+
+
+def frame_signal(audio, blocksize):
+    """Split a mono signal into (n_blocks, blocksize), dropping the ragged tail"""
+    audio = np.asarray(audio, dtype="float32").reshape(-1)
+    n_blocks = len(audio) // blocksize
+    return audio[:n_blocks * blocksize].reshape(n_blocks, blocksize)
+
+
+# ------------------ Endpointers ------------------
+class FixedEndpointer:
+    """The original rule: RMS above a fixed threshold is speech, a fixed silence tail ends it"""
+
+    def __init__(self, sample_rate, silence_threshold=0.01, silence_duration=0.7):
+        self.sample_rate = sample_rate
+        self.silence_threshold = silence_threshold
+        self.silence_duration = silence_duration
+        self.reset()
+
+    def reset(self):
+        self.speech_active = False
+        self.silence_time = 0.0
+
+    def current_tail(self) -> float:
+        return self.silence_duration
+
+    def is_speech(self, block) -> bool:
+        return block_features(block, self.sample_rate)["rms"][0] >= self.silence_threshold
+
+    def force_speech(self):
+        self.speech_active = True
+        self.silence_time = 0.0
+
+    def advance_silence(self, seconds) -> bool:
+        """Count silence while no audio arrives; True if that ends the utterance"""
+        if not self.speech_active:
+            return False
+        self.silence_time += seconds
+        if self.silence_time >= self.current_tail():
+            self.reset()
+            return True
+        return False
+
+    def process(self, block):
+        """Feed one block; returns "start", "end" or None"""
+        if self.is_speech(block):
+            started = not self.speech_active
+            self.force_speech()
+            return "start" if started else None
+        if self.speech_active:
+            return "end" if self.advance_silence(block.shape[0] / self.sample_rate) else None
+        return None
+
+
+class AdaptiveEndpointer(FixedEndpointer):
+    """
+    Endpointer with a tracked noise floor and an SNR-dependent silence tail.
+
+    A block is speech when its level clears both an absolute minimum and the
+    noise floor by snr_ratio, and it looks like voice: energy in the voice band,
+    and either a peaky (non-flat) spectrum or a low zero-crossing rate. The floor
+    follows quiet blocks quickly downward and slowly upward. The silence tail
+    shrinks from max_tail towards min_tail as the utterance's SNR rises, so clean
+    speech ends quickly while noisy rooms keep the cautious tail.
+    """
+
+    def __init__(
+        self,
+        sample_rate,
+        silence_threshold=0.004,
+        snr_ratio=3.0,
+        min_tail=0.3,
+        max_tail=0.7,
+        clean_snr_db=30.0,
+        noisy_snr_db=12.0,
+        max_flatness=0.3,
+        max_zcr=0.25,
+        min_speech_band=0.5,
+    ):
+        self.snr_ratio = snr_ratio
+        self.min_tail = min_tail
+        self.max_tail = max_tail
+        self.clean_snr_db = clean_snr_db
+        self.noisy_snr_db = noisy_snr_db
+        self.max_flatness = max_flatness
+        self.max_zcr = max_zcr
+        self.min_speech_band = min_speech_band
+        self.noise_floor = silence_threshold / snr_ratio
+        self.speech_level = 0.0
+        super().__init__(sample_rate, silence_threshold, max_tail)
+
+    def reset(self):
+        super().reset()
+        self.speech_level = 0.0
+
+    def snr_db(self) -> float:
+        if self.speech_level <= 0 or self.noise_floor <= 0:
+            return 0.0
+        return 20 * math.log10(self.speech_level / self.noise_floor)
+
+    def current_tail(self) -> float:
+        snr = self.snr_db()
+        span = self.clean_snr_db - self.noisy_snr_db
+        cleanliness = min(1.0, max(0.0, (snr - self.noisy_snr_db) / span))
+        return self.max_tail - cleanliness * (self.max_tail - self.min_tail)
+
+    def is_speech(self, block) -> bool:
+        feats = block_features(block, self.sample_rate)
+        rms = float(feats["rms"][0])
+        loud = rms >= max(self.silence_threshold, self.noise_floor * self.snr_ratio)
+        voiced = (
+            feats["speech_band"][0] >= self.min_speech_band
+            and (feats["flatness"][0] <= self.max_flatness or feats["zcr"][0] <= self.max_zcr)
+        )
+        speech = loud and voiced
+
+        if speech:
+            self.speech_level = rms if self.speech_level == 0 else 0.8 * self.speech_level + 0.2 * rms
+            # creep up even during long speech so a sudden permanent noise rise is eventually absorbed
+            self.noise_floor += 0.001 * (rms - self.noise_floor)
+        elif rms < self.noise_floor:
+            self.noise_floor += 0.3 * (rms - self.noise_floor)
+        else:
+            self.noise_floor += 0.02 * (rms - self.noise_floor)
+        self.noise_floor = max(self.noise_floor, 1e-5)
+        return speech
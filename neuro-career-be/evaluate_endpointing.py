@@ -0,0 +1,133 @@
+"""
+Offline comparison of the fixed and adaptive endpointers on recorded WAV files.
+
+Usage:
+    python evaluate_endpointing.py recordings/*.wav
+
+Each WAV needs a sidecar label file with the same name and a .txt extension, in
+Audacity label format (one "start<TAB>end<TAB>label" line per utterance, times in
+seconds). An utterance spans the whole turn, including its internal pauses.
+
+Per utterance the blocks are replayed through each endpointer exactly as app1
+feeds them and we report:
+  - endpoint latency: time from the labelled end of speech to the endpoint
+  - false cut:        an endpoint fired inside a labelled utterance
+  - missed:           no endpoint before the next utterance starts (or file ends)
+"""
+import argparse
+import os
+
+import numpy as np
+import soundfile as sf
+
+from endpointing import AdaptiveEndpointer, FixedEndpointer, frame_signal
+
+SAMPLE_RATE = 16000
+BLOCKSIZE = 1024
+MIN_UTTERANCE_DURATION = 0.15
+
+
+def load_labels(path):
+    segments = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.strip().split("\t")
+            if len(parts) < 2 or parts[0].startswith("\\"):
+                continue
+            segments.append((float(parts[0]), float(parts[1])))
+    return sorted(segments)
+
+
+def load_audio(path):
+    audio, sr = sf.read(path, dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)
+    if sr != SAMPLE_RATE:
+        # linear resample is plenty for level/spectral-shape features
+        n_out = int(len(audio) * SAMPLE_RATE / sr)
+        audio = np.interp(np.linspace(0, len(audio) - 1, n_out), np.arange(len(audio)), audio).astype("float32")
+    return audio
+
+
+def run_endpointer(endpointer, audio):
+    """Replay audio block by block; returns [(start_sec, end_sec)] of dispatched utterances"""
+    blocks = frame_signal(audio, BLOCKSIZE)[:, :, np.newaxis]  # (n, blocksize, 1) like the mic callback
+    block_sec = BLOCKSIZE / SAMPLE_RATE
+    utterances = []
+    start = None
+    for i, block in enumerate(blocks):
+        event = endpointer.process(block)
+        if event == "start":
+            start = i * block_sec
+        elif event == "end" and start is not None:
+            end = (i + 1) * block_sec
+            # same minimum-length filter app1 applies before dispatching
+            if end - start >= MIN_UTTERANCE_DURATION:
+                utterances.append((start, end))
+            start = None
+    return utterances
+
+
+def score(labels, endpoints, file_end):
+    latencies = []
+    false_cuts = 0
+    missed = 0
+    for idx, (seg_start, seg_end) in enumerate(labels):
+        next_start = labels[idx + 1][0] if idx + 1 < len(labels) else file_end
+        false_cuts += sum(1 for _, t in endpoints if seg_start < t < seg_end)
+        after = [t for _, t in endpoints if seg_end <= t <= next_start]
+        if after:
+            latencies.append(after[0] - seg_end)
+        else:
+            missed += 1
+    return latencies, false_cuts, missed
+
+
+def summarize(name, latencies, false_cuts, missed, n_utterances):
+    lat = np.array(latencies) if latencies else np.array([np.nan])
+    print(
+        f"{name:<10} utterances={n_utterances:<4} "
+        f"latency mean={np.nanmean(lat) * 1000:6.0f}ms p50={np.nanpercentile(lat, 50) * 1000:6.0f}ms "
+        f"p90={np.nanpercentile(lat, 90) * 1000:6.0f}ms  "
+        f"false-cut rate={false_cuts / max(n_utterances, 1):.3f}  missed={missed}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fixed vs adaptive endpointing on labelled WAVs")
+    parser.add_argument("wavs", nargs="+", help="WAV files with Audacity .txt labels alongside")
+    parser.add_argument("--silence-threshold", type=float, default=0.01, help="fixed rule RMS threshold")
+    parser.add_argument("--silence-duration", type=float, default=0.7, help="fixed rule silence tail (s)")
+    args = parser.parse_args()
+
+    totals = {"fixed": [[], 0, 0], "adaptive": [[], 0, 0]}
+    n_total = 0
+    for wav in args.wavs:
+        label_path = os.path.splitext(wav)[0] + ".txt"
+        if not os.path.exists(label_path):
+            print(f"Skipping {wav}: no label file {label_path}")
+            continue
+        labels = load_labels(label_path)
+        audio = load_audio(wav)
+        file_end = len(audio) / SAMPLE_RATE
+        n_total += len(labels)
+
+        print(f"\n{wav} ({len(labels)} utterances, {file_end:.1f}s)")
+        endpointers = {
+            "fixed": FixedEndpointer(SAMPLE_RATE, args.silence_threshold, args.silence_duration),
+            "adaptive": AdaptiveEndpointer(SAMPLE_RATE, max_tail=args.silence_duration),
+        }
+        for name, endpointer in endpointers.items():
+            latencies, false_cuts, missed = score(labels, run_endpointer(endpointer, audio), file_end)
+            summarize(name, latencies, false_cuts, missed, len(labels))
+            totals[name][0].extend(latencies)
+            totals[name][1] += false_cuts
+            totals[name][2] += missed
+
+    if n_total:
+        print("\nOverall")
+        for name, (latencies, false_cuts, missed) in totals.items():
+            summarize(name, latencies, false_cuts, missed, n_total)
+
+
+if __name__ == "__main__":
+    main()
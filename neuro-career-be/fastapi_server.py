@@ -1,6 +1,7 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, Header, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response, JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import uvicorn
 import os
@@ -11,9 +12,29 @@ import assemblyai as aai
 from elevenlabs import ElevenLabs
 import json
 import traceback
+import asyncio
+import base64
+import hmac
+import threading
 import time
+from typing import Optional
 from datetime import datetime, timedelta
 
+from reply_cache import ReplyCache
+from conversation_memory import SessionMemoryStore
+from single_flight import SingleFlight
+from audio_bank import AudioBank, DEFAULT_BANK_PATH, STATIC_UTTERANCES
+from tts_formats import AudioVariantCache, TTSVariant, encode_from_pcm, resolve_variant
+from admission import AdmissionController, EndpointClass, admission_middleware
+from tts_budget import BudgetExceeded, CharacterBudgetScheduler, ProviderBlocked
+from tts_chunking import split_for_synthesis, stitch_audio
+from tracing import Tracer, set_attr, span, tracing_middleware
+from profiling import LoopLagMonitor, SamplingProfiler, profiling_middleware
+from model_router import ModelRouter, ModelTier
+from tts_prefetch import TTSPrefetcher
+from assessment_log import AssessmentLog
+from idempotency import IdempotencyStore, idempotency_middleware
+
 # ------------------ Load environment variables ------------------
 ENV_PATH = ".env"   # .env file in the same directory
 load_dotenv(dotenv_path=ENV_PATH)
@@ -32,51 +53,155 @@ aai.settings.api_key = ASSEMBLYAI_KEY
 genai.configure(api_key=GEMINI_KEY)
 eleven_client = ElevenLabs(api_key=ELEVEN_KEY)
 
-# ------------------ Rate limiting and quota tracking ------------------
-class TTSQuotaTracker:
-    def __init__(self):
-        self.request_times = []
-        self.quota_exhausted = False
-        self.quota_reset_time = None
-        self.max_requests_per_minute = 20  # Conservative limit for free tier
-        
-    def can_make_request(self):
-        """Check if we can make a request without hitting rate limits"""
-        now = datetime.now()
-        
-        # If quota is exhausted and we haven't reached reset time, return False
-        if self.quota_exhausted and self.quota_reset_time and now < self.quota_reset_time:
-            return False
-            
-        # Clean old requests (older than 1 minute)
-        self.request_times = [req_time for req_time in self.request_times 
-                             if now - req_time < timedelta(minutes=1)]
-        
-        # Check if we're under the rate limit
-        return len(self.request_times) < self.max_requests_per_minute
-    
-    def record_request(self):
-        """Record a successful request"""
-        self.request_times.append(datetime.now())
-        
-    def record_quota_exhausted(self):
-        """Record that quota is exhausted, set reset time to 1 hour from now"""
-        self.quota_exhausted = True
-        self.quota_reset_time = datetime.now() + timedelta(hours=1)
-        print(f"ElevenLabs quota exhausted, will retry after {self.quota_reset_time}")
-        
-    def reset_quota_status(self):
-        """Reset quota status if enough time has passed"""
-        if self.quota_exhausted and self.quota_reset_time and datetime.now() >= self.quota_reset_time:
-            self.quota_exhausted = False
-            self.quota_reset_time = None
-            print("ElevenLabs quota status reset, attempting API calls again")
+ELEVEN_VOICE_ID = "pNInz6obpgDQGcFmaJgB"
+ELEVEN_TTS_MODEL = "eleven_turbo_v2"
+
+# ------------------ TTS character budget ------------------
+# ElevenLabs quota is spent in characters: rolling per-minute/hour/day budgets, low-priority speech
+# is downgraded to browser synthesis before it can starve the replies users are waiting for
+tts_budget = CharacterBudgetScheduler(
+    windows=[
+        ("minute", 60, int(os.getenv("TTS_CHARS_PER_MINUTE", 2000))),
+        ("hour", 3600, int(os.getenv("TTS_CHARS_PER_HOUR", 8000))),
+        ("day", 86400, int(os.getenv("TTS_CHARS_PER_DAY", 30000))),
+    ],
+    low_priority_reserve=float(os.getenv("TTS_LOW_PRIORITY_RESERVE", 0.2)),
+    burn_guard=float(os.getenv("TTS_BURN_GUARD", 0.5)),
+    max_wait=float(os.getenv("TTS_BUDGET_MAX_WAIT", 2.0)),
+)
 
-tts_quota_tracker = TTSQuotaTracker()
+# ------------------ Reply cache ------------------
+reply_cache = ReplyCache(
+    max_size=int(os.getenv("REPLY_CACHE_SIZE", 256)),
+    ttl_seconds=int(os.getenv("REPLY_CACHE_TTL_SECONDS", 1800)),
+)
+
+# ------------------ Conversation memory ------------------
+# Rolling per-session history kept under a fixed token budget, so the prompt stays constant in size per turn
+session_memories = SessionMemoryStore(
+    turn_budget=int(os.getenv("MEMORY_TURN_TOKENS", 600)),
+    summary_budget=int(os.getenv("MEMORY_SUMMARY_TOKENS", 150)),
+)
+
+# ------------------ Request coalescing ------------------
+# Identical concurrent provider calls (same TTS text+voice, same LLM prompt) share one upstream call
+provider_flights = SingleFlight(name="provider")
+
+# ------------------ Pre-rendered audio bank ------------------
+# Fixed utterances (see build_audio_bank.py) are served from a memory-mapped bank without touching ElevenLabs
+audio_bank = AudioBank(os.getenv("AUDIO_BANK_PATH", DEFAULT_BANK_PATH))
+audio_bank.load()
+
+# ------------------ TTS variant cache ------------------
+# Encoded audio per (text, format, bitrate tier), plus bytes-served-per-format counters
+tts_variants = AudioVariantCache(
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    ttl_seconds=int(os.getenv("TTS_CACHE_TTL_SECONDS", 3600)),
+)
+
+# ------------------ Chunked synthesis ------------------
+# Long replies are split at sentence/clause boundaries and the chunks synthesized in parallel;
+# TTS_MAX_CONCURRENT caps simultaneous ElevenLabs calls across all requests. Only single-flight
+# leaders take a slot (in their worker thread), so coalesced followers don't hold one while waiting
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", 250))
+TTS_CHUNK_MIN_CHARS = int(os.getenv("TTS_CHUNK_MIN_CHARS", 80))
+TTS_MAX_PARALLEL_CHUNKS = int(os.getenv("TTS_MAX_PARALLEL_CHUNKS", 4))
+tts_provider_slots = threading.BoundedSemaphore(int(os.getenv("TTS_MAX_CONCURRENT", 4)))
+
+# ------------------ TTS prefetch ------------------
+# Chat replies start synthesizing immediately; the client's follow-up TTS request claims the result
+tts_prefetch = TTSPrefetcher(ttl_seconds=int(os.getenv("TTS_PREFETCH_TTL_SECONDS", 30)))
+
+# ------------------ Assessment log ------------------
+# Slot updates and completed assessments, queued in memory and flushed to rotating JSONL segments in the background
+assessment_log = AssessmentLog(
+    directory=os.getenv("ASSESSMENT_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "assessment_log")),
+    flush_interval=float(os.getenv("ASSESSMENT_LOG_FLUSH_SECONDS", 1.0)),
+    rotate_bytes=int(os.getenv("ASSESSMENT_LOG_ROTATE_BYTES", 8 * 1024 * 1024)),
+    rotate_seconds=int(os.getenv("ASSESSMENT_LOG_ROTATE_SECONDS", 24 * 3600)),
+)
 
 # ------------------ FastAPI app ------------------
 app = FastAPI(title="AI Career Assessment API", version="1.0.0")
 
+# ------------------ Admission control ------------------
+# Per-endpoint concurrency limits with a short priority queue; overload is shed early with Retry-After.
+# Interactive chat/voice turns go first, transcription next, TTS last (it has a browser fallback,
+# so it is shed with 429 like the quota path).
+admission = AdmissionController(
+    global_limit=int(os.getenv("ADMISSION_GLOBAL_LIMIT", 16)),
+    classes=[
+        EndpointClass("chat", limit=8, max_queue=16, max_wait=3.0, priority=0),
+        EndpointClass("voice-turn", limit=4, max_queue=8, max_wait=3.0, priority=0),
+        EndpointClass("transcribe", limit=4, max_queue=8, max_wait=2.0, priority=1),
+        EndpointClass("tts", limit=4, max_queue=4, max_wait=0.5, priority=2, shed_status=429),
+    ],
+)
+# registered before CORS so CORS stays the outer layer and shed responses still carry CORS headers
+app.middleware("http")(admission_middleware(admission, {
+    "/api/chat": "chat",
+    "/api/voice-turn": "voice-turn",
+    "/api/transcribe": "transcribe",
+    "/api/text-to-speech": "tts",
+}))
+
+# ------------------ Idempotency keys ------------------
+# Retried POSTs carrying the same Idempotency-Key get the stored response (or wait for the original)
+# instead of re-running Gemini/AssemblyAI/ElevenLabs and re-applying slots.
+# Registered after admission so replays skip the admission queue.
+idempotency_store = IdempotencyStore(
+    ttl_seconds=int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 600)),
+    max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 2000)),
+    max_bytes=int(os.getenv("IDEMPOTENCY_MAX_BYTES", 64 * 1024 * 1024)),
+)
+app.middleware("http")(idempotency_middleware(
+    idempotency_store,
+    {"/api/chat", "/api/transcribe", "/api/text-to-speech", "/api/voice-turn"},
+))
+
+# ------------------ Request tracing ------------------
+# Per-request spans (reading the upload, provider calls, JSON parsing, slot merging) tied together by a correlation ID;
+# sampled, slow and failed traces are appended to TRACE_SINK_PATH as JSON lines by a background thread.
+# Registered after admission so queueing time shows up inside the trace.
+tracer = Tracer(
+    sink_path=os.getenv("TRACE_SINK_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces.jsonl")),
+    sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", 0.1)),
+    slow_ms=float(os.getenv("TRACE_SLOW_MS", 2000)),
+)
+app.middleware("http")(tracing_middleware(tracer))
+
+# ------------------ Profiling ------------------
+# Opt-in: with PROFILING_TOKEN set, a request sent with "X-Profile: <token>" (or the next N requests armed via
+# POST /api/admin/profile) is sampled and written to PROFILE_DIR as collapsed stacks for flame graphs.
+# The event-loop lag monitor is always on and logs the stack of whatever blocks the loop past LOOP_LAG_THRESHOLD_MS.
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+profiler = SamplingProfiler(
+    out_dir=os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")),
+    interval=float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000,
+)
+app.middleware("http")(profiling_middleware(profiler, PROFILING_TOKEN))
+loop_lag_monitor = LoopLagMonitor(threshold=float(os.getenv("LOOP_LAG_THRESHOLD_MS", 250)) / 1000)
+
+
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    loop_lag_monitor.start()
+
+
+@app.on_event("startup")
+async def start_assessment_log():
+    assessment_log.start()
+
+
+@app.on_event("shutdown")
+async def flush_assessment_log():
+    await assessment_log.stop()
+
+
+@app.on_event("shutdown")
+async def flush_traces():
+    await asyncio.to_thread(tracer.flush)
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -95,14 +220,27 @@ app.add_middleware(
 # ------------------ Pydantic models ------------------
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None   # conversation memory is only kept for requests that send one
+    prefetch_audio: bool = True   # start synthesizing the reply for the follow-up /api/text-to-speech call
 
 class TTSRequest(BaseModel):
     message: str
+    format: str = None    # mp3 (default), opus, pcm, wav
+    quality: str = None   # low, standard (default), high
+    priority: str = None  # high (default) or low; low is downgraded first when the budget runs short
+    session_id: Optional[str] = None  # claims audio prefetched by /api/chat for the same session
+
+class ProfileRequest(BaseModel):
+    requests: int = 1             # how many upcoming requests to profile
+    path: Optional[str] = None    # only profile this path, e.g. /api/chat
 
 class TTSStatusResponse(BaseModel):
     can_use_elevenlabs: bool
     requests_remaining: int
-    quota_reset_time: str = None
+    characters_remaining: int
+    burn_rate_chars_per_minute: float = 0.0
+    quota_reset_time: Optional[str] = None
+    budgets: list = []
 
 # ------------------ State (use consistent slot keys) ------------------
 state = {
@@ -119,8 +257,16 @@ state = {
 # ------------------ AI Assistant ------------------
 class AI_Assistant:
     def __init__(self):
-        # model name kept as in your original code; change if needed
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
+        # light tier for simple turns, strong tier (the original model) for rich ones; see ModelRouter
+        light_model = os.getenv("GEMINI_LIGHT_MODEL", "gemini-2.0-flash-lite")
+        strong_model = os.getenv("GEMINI_STRONG_MODEL", "gemini-2.0-flash")
+        self.router = ModelRouter(
+            light=ModelTier("light", light_model, genai.GenerativeModel(light_model),
+                            degraded_ms=float(os.getenv("GEMINI_LIGHT_DEGRADED_MS", 2500))),
+            strong=ModelTier("strong", strong_model, genai.GenerativeModel(strong_model),
+                             degraded_ms=float(os.getenv("GEMINI_STRONG_DEGRADED_MS", 5000))),
+            probe_interval=float(os.getenv("GEMINI_PROBE_INTERVAL", 30)),
+        )
         self.system_prompt = """
 You are a prototype career counsellor chatbot named Lonita.
 Your role is to help students explore career paths based on their basic background and preferences.
@@ -178,7 +324,7 @@ Return ONLY valid JSON, nothing else.
         )
         return prompt
 
-    def get_response(self, user_input: str) -> dict:
+    def get_response(self, user_input: str, memory=None) -> dict:
         """
         Returns a dict with:
         {
@@ -186,13 +332,33 @@ Return ONLY valid JSON, nothing else.
             "response": "Acknowledging message and next question"
         }
         This tries to parse model output as JSON. If model returns non-JSON, we fallback safely.
+        Greetings and bare acknowledgements are served from reply_cache when the same state was seen before.
+        If a ConversationMemory is given, its bounded history block is included in the prompt.
         """
+        # the reply depends on the history too, so it is part of the cache key
+        history = memory.render() if memory is not None else ""
+        cached = reply_cache.get(user_input, state, history)
+        if cached is not None:
+            return cached
+
         try:
             context_prompt = self.build_context_prompt()
+            if history:
+                context_prompt = f"{context_prompt}\n\n{history}\n"
             full_prompt = f"{self.system_prompt}\n\n{context_prompt}\nStudent says: \"{user_input}\"\n\nJSON:"
 
-            # call model
-            response = self.model.generate_content(full_prompt)
+            # pick a model tier from cheap local features, then call it
+            # (identical prompts already in flight on the same tier share one Gemini call)
+            decision = self.router.route(user_input, state)
+            with span("provider.gemini", prompt_chars=len(full_prompt), reason=decision["reason"]) as attrs:
+                response, attrs["tier"] = self.router.generate(
+                    decision,
+                    lambda tier: provider_flights.do(
+                        ("llm", tier.name, full_prompt),
+                        lambda: tier.model.generate_content(full_prompt),
+                        kind="llm",
+                    ),
+                )
 
             # If response object has text attr, try to parse it
             text_out = None
@@ -226,7 +392,7 @@ Return ONLY valid JSON, nothing else.
                 # safe default: no slots, simple question back
                 return {
                     "slots": {},
-                    "response": "I'm here to help with your career exploration. Could you tell me a bit about yourself (age, class, interests, skills, constraints, values, prior exploration)?"
+                    "response": STATIC_UTTERANCES["fallback_intro"]
                 }
 
             # Try to parse JSON from text_out
@@ -238,7 +404,8 @@ Return ONLY valid JSON, nothing else.
                     if cleaned.lower().startswith("json"):
                         cleaned = cleaned[4:].strip()
                 
-                parsed = json.loads(cleaned)
+                with span("llm.parse_json", chars=len(cleaned)):
+                    parsed = json.loads(cleaned)
                 # Ensure dict has required keys
                 if not isinstance(parsed, dict):
                     raise ValueError("Parsed not a dict")
@@ -249,14 +416,17 @@ Return ONLY valid JSON, nothing else.
                 if slots is None:
                     slots = {}
                 
-                return {"slots": slots, "response": resp}
+                reply = {"slots": slots, "response": resp}
+                # only well-formed model replies are cached, never the fallbacks
+                reply_cache.put(user_input, state, reply, history)
+                return reply
             except Exception:
                 # If model returned non-JSON text, safely fall back to returning that text as response and no slots
                 return {"slots": {}, "response": text_out.strip()}
 
         except Exception as e:
             traceback.print_exc()
-            return {"slots": {}, "response": "I apologize, but I'm having trouble responding right now. Could you please try again?"}
+            return {"slots": {}, "response": STATIC_UTTERANCES["fallback_error"]}
         
 
 
@@ -270,6 +440,36 @@ async def root():
     return {"message": "AI Career Assessment API is running!"}
 
 
+def transcribe_bytes(audio_data: bytes) -> str:
+    """Transcribe raw uploaded audio with AssemblyAI; returns "" when nothing was recognized.
+       Blocking — call through run_in_threadpool from handlers.
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
+        temp_file.write(audio_data)
+        temp_file_path = temp_file.name
+
+    try:
+        with span("provider.assemblyai", bytes=len(audio_data)):
+            transcriber = aai.Transcriber()
+            transcript = transcriber.transcribe(temp_file_path)
+
+        # Several SDKs return transcript.text or transcript.content
+        transcript_text = ""
+        try:
+            transcript_text = getattr(transcript, "text", None) or getattr(transcript, "content", None) or ""
+        except Exception:
+            transcript_text = str(transcript)
+        return transcript_text
+
+    finally:
+        # Clean up
+        if os.path.exists(temp_file_path):
+            try:
+                os.unlink(temp_file_path)
+            except Exception:
+                pass
+
+
 @app.post("/api/transcribe")
 async def transcribe_audio(file: UploadFile = File(...)):
     """Transcribe uploaded audio file using AssemblyAI.
@@ -280,48 +480,116 @@ async def transcribe_audio(file: UploadFile = File(...)):
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file provided")
 
-        audio_data = await file.read()
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-            temp_file.write(audio_data)
-            temp_file_path = temp_file.name
-
-        try:
-            transcriber = aai.Transcriber()
-            transcript = transcriber.transcribe(temp_file_path)
-
-            # Several SDKs return transcript.text or transcript.content
-            transcript_text = ""
-            try:
-                transcript_text = getattr(transcript, "text", None) or getattr(transcript, "content", None) or ""
-            except Exception:
-                transcript_text = str(transcript)
-
-            if not transcript_text:
-                transcript_text = "No speech detected in the audio."
+        # the body was already received and spooled before the handler ran; this times reading it back
+        with span("upload.read") as attrs:
+            audio_data = await file.read()
+            attrs["bytes"] = len(audio_data)
+        transcript_text = await run_in_threadpool(transcribe_bytes, audio_data)
 
-            return {"transcription": transcript_text}
+        if not transcript_text:
+            transcript_text = "No speech detected in the audio."
 
-        finally:
-            # Clean up
-            if os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)
-                except Exception:
-                    pass
+        return {"transcription": transcript_text}
 
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
 
 
+def apply_chat_turn(user_msg: str, ai_reply: dict, memory, session_id: str = None) -> str:
+    """
+    Merge the slots from a model reply into the global state and record the turn:
+    - If Gemini returns no slots, use keyword fallback detection (if/elif chain) to attempt to extract obvious fields
+    - Update the global state with any newly-detected slots (only fills empty slots)
+    - Queue newly filled slots (and the full state once every slot is filled) on the assessment log
+    Returns the assistant response text.
+    """
+    # Expect ai_reply to be dict with 'slots' and 'response'
+    slots = ai_reply.get("slots", {}) if isinstance(ai_reply, dict) else {}
+    response_text = ai_reply.get("response", "") if isinstance(ai_reply, dict) else str(ai_reply)
+
+    # --- Fallback keyword detection (only if model returned no slots) ---
+    # We'll attempt to find multiple slots in a single user message (not just one)
+    if not slots:
+        low = user_msg.lower()
+        candidate_slots = {}
+
+        # Age
+        # look for patterns like "i am 17", "i'm 17", "17 years", or "17-year-old"
+        import re
+        age_match = re.search(r"\b(?:i am|i'm|i’m|age is|age)\s+(\d{1,2})\b", low)
+        if not age_match:
+            # also numbers followed by 'years' or 'years old'
+            age_match = re.search(r"\b(\d{1,2})\s+(?:years|yrs|years old|yrs old)\b", low)
+        if age_match:
+            candidate_slots["Age"] = age_match.group(1)
+
+        # School Class / grade
+        if any(word in low for word in ["12th", "11th", "10th", "grade", "class"]):
+            # naive extraction: take the whole message as class if class/grade mentioned
+            # you could refine this with regex
+            if "12th" in low:
+                candidate_slots["School Class"] = "12th"
+            elif "11th" in low:
+                candidate_slots["School Class"] = "11th"
+            elif "10th" in low:
+                candidate_slots["School Class"] = "10th"
+            else:
+                # fallback: the exact phrase containing 'class' or 'grade'
+                candidate_slots["School Class"] = user_msg
+
+        # Location
+        if any(word in low for word in ["city", "town", "live in", "i live in", "from"]):
+            # simple heuristic: assume last word(s)
+            candidate_slots["Location"] = user_msg
+
+        # Interests
+        if any(word in low for word in ["interest", "interested", "i like", "i love", "i'm interested in", "interested in"]):
+            candidate_slots["Interests"] = user_msg
+
+        # Skills
+        if any(word in low for word in ["skill", "good at", "i can", "i'm good at", "i am good at", "coding", "python", "java", "programming"]):
+            candidate_slots["Skills"] = user_msg
+
+        # Constraints
+        if any(word in low for word in ["constraint", "constraints", "parents", "can't", "cannot", "need to stay", "stay in"]):
+            candidate_slots["Constraints"] = user_msg
+
+        # Values
+        if any(word in low for word in ["value", "values", "work-life", "work life", "helping others", "money", "balance"]):
+            candidate_slots["Values"] = user_msg
+
+        # Prior Exploration
+        if any(word in low for word in ["hackathon", "intern", "internship", "project", "tried", "explored", "experience"]):
+            candidate_slots["Prior Exploration"] = user_msg
+
+        # Use candidate_slots if any found
+        if candidate_slots:
+            slots = candidate_slots
+
+    # Update global state with whatever slots we detected
+    if isinstance(slots, dict) and slots:
+        before = dict(state)
+        assistant.process_new_answers(slots)
+        filled = {k: v for k, v in state.items() if v != before[k]}
+        if filled:
+            assessment_log.record("slots", session_id, slots=filled)
+            if all(state.values()) and not all(before.values()):
+                assessment_log.record("completed", session_id, state=dict(state))
+
+    # Remember this turn for the next prompt (older turns get folded into the summary)
+    if memory is not None:
+        memory.add_turn("Student", user_msg)
+        memory.add_turn("Lonita", response_text)
+    return response_text
+
+
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
     """
     Hybrid chat endpoint:
     - First, ask Gemini for structured JSON: {"slots": {...}, "response": "..."}
-    - If Gemini returns no slots, use keyword fallback detection (if/elif chain) to attempt to extract obvious fields
-    - Update the global state with any newly-detected slots (only fills empty slots)
+    - Merge detected slots into the global state (see apply_chat_turn)
     - Return the assistant response plus updated state
     """
     try:
@@ -329,77 +597,37 @@ async def chat(request: ChatRequest):
             raise HTTPException(status_code=400, detail="Message cannot be empty")
 
         user_msg = request.message.strip()
-        ai_reply = assistant.get_response(user_msg)
-
-        # Expect ai_reply to be dict with 'slots' and 'response'
-        slots = ai_reply.get("slots", {}) if isinstance(ai_reply, dict) else {}
-        response_text = ai_reply.get("response", "") if isinstance(ai_reply, dict) else str(ai_reply)
+        set_attr("session_id", request.session_id)
+        # without a session id there is no way to keep clients' histories apart, so keep none
+        memory = session_memories.get(request.session_id) if request.session_id else None
+        # run the blocking SDK call off the event loop so concurrent requests can overlap (and coalesce)
+        ai_reply = await run_in_threadpool(assistant.get_response, user_msg, memory)
+
+        # start speech for the reply now instead of waiting for the client's TTS request, at the
+        # priority that request would use. Only for clients with a session (the slot is per session),
+        # and not while TTS requests are being queued/shed or the budget is down to its reserve:
+        # this runs outside the tts admission class, so it must not add provider work under load
+        reply_text = ai_reply.get("response", "") if isinstance(ai_reply, dict) else str(ai_reply)
+        if (
+            request.prefetch_audio
+            and request.session_id
+            and reply_text.strip()
+            and not admission.saturated("tts")
+            and tts_budget.has_headroom(len(reply_text.strip()))
+        ):
+            variant = resolve_variant()
+            tts_prefetch.start(
+                request.session_id,
+                reply_text.strip(),
+                variant.key,
+                lambda: synthesize_speech(reply_text.strip(), variant, "high"),
+            )
 
-        # --- Fallback keyword detection (only if model returned no slots) ---
-        # We'll attempt to find multiple slots in a single user message (not just one)
-        if not slots:
-            low = user_msg.lower()
-            candidate_slots = {}
-
-            # Age
-            # look for patterns like "i am 17", "i'm 17", "17 years", or "17-year-old"
-            import re
-            age_match = re.search(r"\b(?:i am|i'm|i’m|age is|age)\s+(\d{1,2})\b", low)
-            if not age_match:
-                # also numbers followed by 'years' or 'years old'
-                age_match = re.search(r"\b(\d{1,2})\s+(?:years|yrs|years old|yrs old)\b", low)
-            if age_match:
-                candidate_slots["Age"] = age_match.group(1)
-
-            # School Class / grade
-            if any(word in low for word in ["12th", "11th", "10th", "grade", "class"]):
-                # naive extraction: take the whole message as class if class/grade mentioned
-                # you could refine this with regex
-                if "12th" in low:
-                    candidate_slots["School Class"] = "12th"
-                elif "11th" in low:
-                    candidate_slots["School Class"] = "11th"
-                elif "10th" in low:
-                    candidate_slots["School Class"] = "10th"
-                else:
-                    # fallback: the exact phrase containing 'class' or 'grade'
-                    candidate_slots["School Class"] = user_msg
-
-            # Location
-            if any(word in low for word in ["city", "town", "live in", "i live in", "from"]):
-                # simple heuristic: assume last word(s)
-                candidate_slots["Location"] = user_msg
-
-            # Interests
-            if any(word in low for word in ["interest", "interested", "i like", "i love", "i'm interested in", "interested in"]):
-                candidate_slots["Interests"] = user_msg
-
-            # Skills
-            if any(word in low for word in ["skill", "good at", "i can", "i'm good at", "i am good at", "coding", "python", "java", "programming"]):
-                candidate_slots["Skills"] = user_msg
-
-            # Constraints
-            if any(word in low for word in ["constraint", "constraints", "parents", "can't", "cannot", "need to stay", "stay in"]):
-                candidate_slots["Constraints"] = user_msg
-
-            # Values
-            if any(word in low for word in ["value", "values", "work-life", "work life", "helping others", "money", "balance"]):
-                candidate_slots["Values"] = user_msg
-
-            # Prior Exploration
-            if any(word in low for word in ["hackathon", "intern", "internship", "project", "tried", "explored", "experience"]):
-                candidate_slots["Prior Exploration"] = user_msg
-
-            # Use candidate_slots if any found
-            if candidate_slots:
-                slots = candidate_slots
-
-        # Update global state with whatever slots we detected
-        if isinstance(slots, dict) and slots:
-            assistant.process_new_answers(slots)
+        with span("slots.merge"):
+            response_text = apply_chat_turn(user_msg, ai_reply, memory, request.session_id)
 
         return {
-            "response": ai_reply.get("response", ""),
+            "response": response_text,
             "state": state
         }
 
@@ -409,6 +637,226 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
 
+# Provider errors that mean ElevenLabs is refusing us (quota, auth, abuse detection) rather than failing
+PROVIDER_BLOCK_KEYWORDS = ['401', '429', 'quota', 'unusual activity', 'unusual_activity',
+                           'detected_unusual_activity', 'free tier', 'rate limit',
+                           'too many requests', 'usage limit', 'exceeded', 'abuse', 'disabled']
+
+
+def record_if_provider_block(error):
+    """Start the budget cooldown and return ProviderBlocked if error is a quota/auth/abuse refusal, else None"""
+    error_str = str(error).lower()
+    if not any(keyword in error_str for keyword in PROVIDER_BLOCK_KEYWORDS):
+        return None
+    print(f"ElevenLabs API blocked (quota/auth/abuse issue): {error}")
+    # Back off; abuse detection / disabled accounts get the full cooldown straight away
+    hard = 'unusual' in error_str or 'abuse' in error_str or 'disabled' in error_str
+    tts_budget.record_provider_block("unusual activity" if hard else "quota or rate limit", hard=hard)
+    return ProviderBlocked(str(error))
+
+
+def provider_cache_key(text_to_convert: str, output_format: str, context=None):
+    """Cache and coalescing key for raw provider audio; audio rendered for given neighbours only fits that context"""
+    context = tuple(context) if context and any(context) else None
+    return ("provider", ELEVEN_VOICE_ID, ELEVEN_TTS_MODEL, output_format, text_to_convert, context)
+
+
+async def reserve_characters(chars: int, priority: str):
+    """Reserve chars against the TTS budget (may wait briefly for the minute window to roll over); 429 if denied"""
+    try:
+        with span("tts.budget", chars=chars, priority=priority):
+            return await tts_budget.admit(chars, priority)
+    except BudgetExceeded as e:
+        print(f"TTS budget: {e.reason}, returning 429")
+        headers = {"Retry-After": str(int(e.retry_after) + 1)} if e.retry_after else None
+        raise HTTPException(
+            status_code=429,
+            detail=f"{e.reason}. Please use browser speech synthesis fallback.",
+            headers=headers,
+        )
+
+
+def provider_error_response(error):
+    """Map a failed provider call to what the handler raises"""
+    if isinstance(error, ProviderBlocked):
+        # Return a 429 status to trigger frontend fallback to browser speech synthesis
+        return HTTPException(
+            status_code=429,
+            detail="ElevenLabs API quota exceeded or unusual activity detected. Using browser speech synthesis fallback."
+        )
+    # Re-raise for other types of errors
+    print(f"ElevenLabs API error (non-quota): {error}")
+    return error
+
+
+async def call_provider(text_to_convert: str, output_format: str, context=None):
+    """
+    Raw ElevenLabs output for text in one provider output_format, from the variant cache or a provider
+    call shared with identical concurrent requests. No budget accounting; callers reserve the characters.
+    context is an optional (previous_text, next_text) pair so a chunk keeps the prosody of its neighbours.
+    Returns (audio_bytes, cache_hit, led), led meaning this request's call is the one that reached ElevenLabs.
+    Raises ProviderBlocked when ElevenLabs refuses the call.
+    """
+    cache_key = provider_cache_key(text_to_convert, output_format, context)
+    cached = tts_variants.get(cache_key)
+    if cached is not None:
+        return cached, True, False
+
+    led = []
+
+    neighbours = {}
+    if context:
+        previous_text, next_text = context
+        if previous_text:
+            neighbours["previous_text"] = previous_text
+        if next_text:
+            neighbours["next_text"] = next_text
+
+    def synthesize():
+        try:
+            with tts_provider_slots, span("provider.elevenlabs", chars=len(text_to_convert), format=output_format):
+                # Get audio stream from ElevenLabs
+                audio_stream = eleven_client.text_to_speech.convert(
+                    voice_id=ELEVEN_VOICE_ID,
+                    text=text_to_convert,
+                    model_id=ELEVEN_TTS_MODEL,
+                    output_format=output_format,
+                    **neighbours,
+                )
+
+                # Collect chunks into final bytes
+                audio_bytes = b"".join(chunk for chunk in audio_stream if isinstance(chunk, (bytes, bytearray)))
+        except Exception as e:
+            # recorded here, in the call that reached ElevenLabs; coalesced waiters just get the error
+            blocked = record_if_provider_block(e)
+            if blocked is not None:
+                raise blocked from e
+            raise
+
+        # only the leading request reaches the provider and spends characters
+        led.append(True)
+        tts_variants.put(cache_key, audio_bytes)
+        return audio_bytes
+
+    # Identical texts (in the same context) requested concurrently share a single ElevenLabs call
+    with span("tts.synthesize", chars=len(text_to_convert)) as attrs:
+        audio_bytes = await run_in_threadpool(provider_flights.do, ("tts",) + cache_key[1:], synthesize, "tts")
+        attrs["coalesced"] = not led
+    return audio_bytes, False, bool(led)
+
+
+async def fetch_provider_audio(text_to_convert: str, output_format: str, priority: str = "high"):
+    """
+    Raw ElevenLabs output for text in one provider output_format, from the variant cache when possible.
+    Returns (audio_bytes, cache_hit). Raises HTTPException(429) when ElevenLabs can't be used.
+    """
+    cached = tts_variants.get(provider_cache_key(text_to_convert, output_format))
+    if cached is not None:
+        return cached, True
+
+    # Reserve the characters up front
+    reservation = await reserve_characters(len(text_to_convert), priority)
+    try:
+        audio_bytes, cache_hit, led = await call_provider(text_to_convert, output_format)
+    except Exception as elevenlabs_error:
+        tts_budget.refund(reservation)
+        raise provider_error_response(elevenlabs_error)
+    if led:
+        tts_budget.commit(reservation)
+    else:
+        tts_budget.refund(reservation)  # coalesced onto another request's call, or cached meanwhile
+    return audio_bytes, cache_hit
+
+
+async def fetch_speech_audio(text_to_convert: str, output_format: str, priority: str = "high"):
+    """
+    Like fetch_provider_audio, but long text is split into chunks that are synthesized concurrently
+    (each through the cache and coalescing) and stitched back in order, so latency tracks the longest
+    chunk rather than the whole reply. The whole reply's characters are reserved before any chunk
+    starts, and the first failing chunk cancels the rest, so a denial or provider refusal doesn't
+    spend quota on audio the client will never get. The stitched result is cached as a whole.
+    """
+    chunks = split_for_synthesis(
+        text_to_convert,
+        max_chars=TTS_CHUNK_MAX_CHARS,
+        max_chunks=TTS_MAX_PARALLEL_CHUNKS,
+        min_chunk_chars=TTS_CHUNK_MIN_CHARS,
+    )
+    if len(chunks) == 1:
+        return await fetch_provider_audio(text_to_convert, output_format, priority)
+
+    cache_key = provider_cache_key(text_to_convert, output_format)
+    cached = tts_variants.get(cache_key)
+    if cached is not None:
+        return cached, True
+
+    reservation = await reserve_characters(len(text_to_convert), priority)
+    print(f"Synthesizing {len(chunks)} chunks in parallel ({len(text_to_convert)} chars)")
+    with span("tts.chunked", chunks=len(chunks), chars=len(text_to_convert)):
+        tasks = [
+            asyncio.ensure_future(call_provider(
+                chunk,
+                output_format,
+                context=(chunks[i - 1] if i > 0 else None, chunks[i + 1] if i + 1 < len(chunks) else None),
+            ))
+            for i, chunk in enumerate(chunks)
+        ]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    for task in pending:
+        task.cancel()
+
+    # chunks that led a provider call, or were cancelled mid-call, spent their characters; the rest go back
+    spent = sum(
+        len(chunk) for chunk, task in zip(chunks, tasks)
+        if task in pending or (task.exception() is None and task.result()[2])
+    )
+    failed = next((task.exception() for task in tasks if task in done and task.exception() is not None), None)
+    if failed is None:
+        tts_budget.commit(reservation)
+    tts_budget.refund(reservation, len(text_to_convert) - spent)
+    if failed is not None:
+        raise provider_error_response(failed)
+
+    results = [task.result() for task in tasks]
+    audio_bytes = stitch_audio([audio for audio, _, _ in results], output_format)
+    tts_variants.put(cache_key, audio_bytes)
+    return audio_bytes, all(cache_hit for _, cache_hit, _ in results)
+
+
+async def synthesize_speech(text_to_convert: str, variant: TTSVariant = None, priority: str = "high"):
+    """
+    Produce speech audio for text in the requested format/bitrate tier, honouring the audio bank,
+    variant cache, character budget and request coalescing.
+    Returns (audio, source, variant) where audio is bytes (or a memoryview for bank clips) and
+    source is "audio-bank", "cache" or "elevenlabs". Raises HTTPException(429) when ElevenLabs
+    can't be used.
+    """
+    variant = variant or resolve_variant()
+
+    # Fixed utterances are pre-rendered: serve the memory-mapped clip, no quota used
+    if audio_bank.matches(ELEVEN_VOICE_ID, ELEVEN_TTS_MODEL) and audio_bank.format == variant.provider_format:
+        clip = audio_bank.lookup_text(text_to_convert)
+        if clip is not None:
+            tts_variants.record_served(variant.key, len(clip), True)
+            return clip, "audio-bank", variant
+
+    if not variant.is_derived:
+        audio, cache_hit = await fetch_speech_audio(text_to_convert, variant.provider_format, priority)
+    else:
+        # wav/opus are encoded locally from the PCM master and cached per variant
+        variant_key = ("variant", ELEVEN_VOICE_ID, ELEVEN_TTS_MODEL, variant.key, text_to_convert)
+        audio = tts_variants.get(variant_key)
+        cache_hit = audio is not None
+        if audio is None:
+            pcm, cache_hit = await fetch_speech_audio(text_to_convert, variant.provider_format, priority)
+            with span("tts.encode", format=variant.key):
+                audio = await run_in_threadpool(encode_from_pcm, pcm, variant)
+            tts_variants.put(variant_key, audio)
+
+    tts_variants.record_served(variant.key, len(audio), cache_hit)
+    return audio, ("cache" if cache_hit else "elevenlabs"), variant
+
+
 @app.post("/api/text-to-speech")
 async def text_to_speech(request: TTSRequest):
     try:
@@ -431,71 +879,39 @@ async def text_to_speech(request: TTSRequest):
         if not text_to_convert or not text_to_convert.strip():
             raise HTTPException(status_code=400, detail="No text found to convert to speech")
 
-        print(f"Converting to speech: {text_to_convert[:100]}...")  # Log for debugging
-
-        # Check quota status first
-        tts_quota_tracker.reset_quota_status()
-        
-        # If quota is exhausted or rate limit exceeded, return 429 immediately
-        if not tts_quota_tracker.can_make_request():
-            print("Rate limit or quota exceeded, returning 429 immediately")
-            raise HTTPException(
-                status_code=429, 
-                detail="ElevenLabs API quota exceeded or rate limit reached. Please use browser speech synthesis fallback."
-            )
-
         try:
-            # Get audio stream from ElevenLabs
-            audio_stream = eleven_client.text_to_speech.convert(
-                voice_id="pNInz6obpgDQGcFmaJgB",
-                text=text_to_convert,
-                model_id="eleven_turbo_v2"
-            )
+            variant = resolve_variant(request.format, request.quality)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-            # Collect chunks into final bytes
-            audio_bytes = b"".join(chunk for chunk in audio_stream if isinstance(chunk, (bytes, bytearray)))
+        print(f"Converting to speech ({variant.key}): {text_to_convert[:100]}...")  # Log for debugging
 
-            # Record successful request
-            tts_quota_tracker.record_request()
-
-            return Response(
-                content=audio_bytes,
-                media_type="audio/mpeg",
-                headers={
-                    "Content-Disposition": "attachment; filename=speech.mp3",
-                    "X-TTS-Source": "elevenlabs"  # Header to indicate source
-                },
-            )
-        
-        except Exception as elevenlabs_error:
-            # Check if it's an API quota/auth error
-            error_str = str(elevenlabs_error).lower()
-            
-            # More comprehensive error detection including unusual activity
-            quota_keywords = ['401', '429', 'quota', 'unusual activity', 'unusual_activity', 
-                            'detected_unusual_activity', 'free tier', 'rate limit', 
-                            'too many requests', 'usage limit', 'exceeded', 'abuse', 'disabled']
-            
-            if any(keyword in error_str for keyword in quota_keywords):
-                print(f"ElevenLabs API blocked (quota/auth/abuse issue): {elevenlabs_error}")
-                
-                # Record quota exhaustion for longer period if it's an abuse detection
-                if 'unusual' in error_str or 'abuse' in error_str or 'disabled' in error_str:
-                    print("Detected ElevenLabs abuse/unusual activity - disabling for extended period")
-                    tts_quota_tracker.quota_exhausted = True
-                    tts_quota_tracker.quota_reset_time = datetime.now() + timedelta(hours=24)  # 24 hour cooldown
-                else:
-                    tts_quota_tracker.record_quota_exhausted()
-                
-                # Return a 429 status to trigger frontend fallback to browser speech synthesis
-                raise HTTPException(
-                    status_code=429, 
-                    detail="ElevenLabs API quota exceeded or unusual activity detected. Using browser speech synthesis fallback."
-                )
-            else:
-                # Re-raise for other types of errors
-                print(f"ElevenLabs API error (non-quota): {elevenlabs_error}")
-                raise elevenlabs_error
+        audio = None
+        used_prefetch = False
+        prefetched = tts_prefetch.claim(request.session_id, text_to_convert.strip(), variant.key) if request.session_id else None
+        if prefetched is not None:
+            try:
+                # shield: a client disconnect here must not cancel the shared synthesis
+                with span("tts.prefetch_claim", ready=prefetched.done()):
+                    audio, source, variant = await asyncio.shield(prefetched)
+                used_prefetch = True
+            except Exception as e:
+                # e.g. the prefetch hit the character budget; synthesize normally
+                print(f"Prefetched synthesis unusable ({getattr(e, 'detail', e)}), synthesizing directly")
+        if audio is None:
+            audio, source, variant = await synthesize_speech(text_to_convert, variant, request.priority or "high")
+
+        return Response(
+            # bank clips are memoryview slices of the mapping; Response needs bytes, so this copies the clip once
+            content=bytes(audio),
+            media_type=variant.media_type,
+            headers={
+                "Content-Disposition": f"attachment; filename=speech.{variant.extension}",
+                "X-TTS-Source": source,  # Header to indicate source
+                "X-TTS-Format": variant.key,
+                "X-TTS-Prefetched": "1" if used_prefetch else "0",
+            },
+        )
 
     except HTTPException:
         # Re-raise HTTP exceptions as-is
@@ -505,33 +921,214 @@ async def text_to_speech(request: TTSRequest):
         raise HTTPException(status_code=500, detail=f"Text-to-speech failed: {str(e)}")
 
 
+@app.post("/api/voice-turn")
+async def voice_turn(
+    file: UploadFile = File(...),
+    session_id: str = Form(None),
+    audio_format: str = Form(None),
+    quality: str = Form(None),
+):
+    """
+    One round trip per voice turn: transcribe -> chat -> text-to-speech, all server-side.
+    Returns the transcript, reply, updated state and base64 audio. Synthesis starts as soon as
+    the reply text exists and runs while slots are merged. If ElevenLabs is unavailable the turn
+    still succeeds with "audio": null so the client can use browser speech synthesis.
+    """
+    try:
+        if not file.filename:
+            raise HTTPException(status_code=400, detail="No file provided")
+        try:
+            variant = resolve_variant(audio_format, quality)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # the body was already received and spooled before the handler ran; this times reading it back
+        with span("upload.read") as attrs:
+            audio_data = await file.read()
+            attrs["bytes"] = len(audio_data)
+        transcript = (await run_in_threadpool(transcribe_bytes, audio_data)).strip()
+        if not transcript:
+            return {
+                "transcription": "",
+                "response": "",
+                "state": state,
+                "audio": None,
+                "audio_format": None,
+                "tts_source": None,
+                "tts_error": None,
+            }
+
+        set_attr("session_id", session_id)
+        memory = session_memories.get(session_id) if session_id else None
+        ai_reply = await run_in_threadpool(assistant.get_response, transcript, memory)
+        response_text = ai_reply.get("response", "") if isinstance(ai_reply, dict) else str(ai_reply)
+
+        # overlap synthesis with slot merging / memory bookkeeping: the merge runs in a worker
+        # thread so the event loop is free to drive the TTS task meanwhile
+        tts_task = asyncio.create_task(synthesize_speech(response_text, variant)) if response_text.strip() else None
+        try:
+            with span("slots.merge"):
+                await run_in_threadpool(apply_chat_turn, transcript, ai_reply, memory, session_id)
+        except BaseException:
+            # the turn fails, so nobody will collect the audio; stop it spending characters
+            if tts_task is not None:
+                tts_task.cancel()
+            raise
+
+        audio_b64 = None
+        tts_source = None
+        tts_error = None
+        if tts_task is not None:
+            try:
+                audio, tts_source, variant = await tts_task
+                audio_b64 = base64.b64encode(audio).decode("ascii")
+            except HTTPException as e:
+                tts_error = e.detail
+            except Exception as e:
+                traceback.print_exc()
+                tts_error = f"Text-to-speech failed: {str(e)}"
+
+        return {
+            "transcription": transcript,
+            "response": response_text,
+            "state": state,
+            "audio": audio_b64,
+            "audio_format": variant.media_type if audio_b64 else None,
+            "tts_source": tts_source,
+            "tts_error": tts_error,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Voice turn failed: {str(e)}")
+
+
 @app.get("/api/tts-status")
 async def get_tts_status():
-    """Get current TTS quota status to help frontend decide whether to use ElevenLabs or browser speech"""
+    """Get current TTS character budget to help frontend decide whether to use ElevenLabs or browser speech"""
     try:
-        tts_quota_tracker.reset_quota_status()
-        can_use = tts_quota_tracker.can_make_request()
-        
-        remaining_requests = max(0, tts_quota_tracker.max_requests_per_minute - len(tts_quota_tracker.request_times))
-        
+        status = tts_budget.status()
+
         reset_time = None
-        if tts_quota_tracker.quota_reset_time:
-            reset_time = tts_quota_tracker.quota_reset_time.isoformat()
-            
+        if status["cooldown_seconds"]:
+            reset_time = (datetime.now() + timedelta(seconds=status["cooldown_seconds"])).isoformat()
+
         return TTSStatusResponse(
-            can_use_elevenlabs=can_use and not tts_quota_tracker.quota_exhausted,
-            requests_remaining=remaining_requests,
-            quota_reset_time=reset_time
+            can_use_elevenlabs=status["available"],
+            requests_remaining=status["requests_remaining"],
+            characters_remaining=status["characters_remaining"],
+            burn_rate_chars_per_minute=status["burn_rate_chars_per_minute"],
+            quota_reset_time=reset_time,
+            budgets=status["budgets"],
         )
     except Exception as e:
         # If there's an error checking status, assume we can't use ElevenLabs
         return TTSStatusResponse(
             can_use_elevenlabs=False,
             requests_remaining=0,
+            characters_remaining=0,
             quota_reset_time=None
         )
 
 
+@app.get("/api/tts-budget-stats")
+async def get_tts_budget_stats():
+    """Character budget windows, burn rate and granted/queued/downgraded counters"""
+    return tts_budget.status()
+
+
+@app.get("/api/reply-cache-stats")
+async def get_reply_cache_stats():
+    """Hit-rate statistics for the reply cache, used to size REPLY_CACHE_SIZE / REPLY_CACHE_TTL_SECONDS"""
+    return reply_cache.stats()
+
+
+def check_profiling_token(token: Optional[str]):
+    if not PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set PROFILING_TOKEN)")
+    if not token or not hmac.compare_digest(token.encode(), PROFILING_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+@app.post("/api/admin/profile")
+async def arm_profiler(request: ProfileRequest, x_profile_token: Optional[str] = Header(None)):
+    """Profile the next `requests` requests (optionally only those to `path`)"""
+    check_profiling_token(x_profile_token)
+    profiler.arm(max(0, request.requests), request.path)
+    return profiler.stats()
+
+
+@app.get("/api/admin/profile")
+async def get_profiler_status(x_profile_token: Optional[str] = Header(None)):
+    """Armed request count and the most recently written profiles"""
+    check_profiling_token(x_profile_token)
+    return profiler.stats()
+
+
+@app.get("/api/loop-lag-stats")
+async def get_loop_lag_stats(x_profile_token: Optional[str] = Header(None)):
+    """Event-loop lag; the stack of the last stall is only returned with a valid X-Profile-Token"""
+    if x_profile_token is not None:
+        check_profiling_token(x_profile_token)
+    return loop_lag_monitor.stats(include_stack=x_profile_token is not None)
+
+
+@app.get("/api/idempotency-stats")
+async def get_idempotency_stats():
+    """Stored idempotent responses and replay counts"""
+    return idempotency_store.stats()
+
+
+@app.get("/api/assessment-log-stats")
+async def get_assessment_log_stats():
+    """Queue depth and flush/rotation counters of the assessment log"""
+    return assessment_log.stats()
+
+
+@app.get("/api/tts-prefetch-stats")
+async def get_tts_prefetch_stats():
+    """How often prefetched chat audio was claimed (ready, in flight or already failed), missed or expired"""
+    return tts_prefetch.stats()
+
+
+@app.get("/api/model-routing-stats")
+async def get_model_routing_stats():
+    """Per-tier routed/call counts and rolling Gemini latency"""
+    return assistant.router.stats()
+
+
+@app.get("/api/trace-stats")
+async def get_trace_stats():
+    """Trace sampling/export counters and the sink file location"""
+    return tracer.stats()
+
+
+@app.get("/api/admission-stats")
+async def get_admission_stats():
+    """Per-endpoint in-flight, queued, admitted and shed counts"""
+    return admission.stats()
+
+
+@app.get("/api/tts-format-stats")
+async def get_tts_format_stats():
+    """Bytes served and cache hits per TTS format/bitrate tier, for tuning defaults"""
+    return tts_variants.stats()
+
+
+@app.get("/api/audio-bank-stats")
+async def get_audio_bank_stats():
+    """Pre-rendered clip usage (hits and bytes served without calling ElevenLabs)"""
+    return audio_bank.stats()
+
+
+@app.get("/api/coalescing-stats")
+async def get_coalescing_stats():
+    """How many provider calls were collapsed into an already in-flight identical call"""
+    return provider_flights.stats()
+
+
 # ------------------ Run server ------------------
 if __name__ == "__main__":
     import os
@@ -542,7 +1139,21 @@ if __name__ == "__main__":
     print("  POST /api/transcribe - Audio transcription")
     print("  POST /api/chat - AI chat responses")
     print("  POST /api/text-to-speech - Text-to-speech conversion")
-    print("  GET /api/tts-status - TTS quota and availability status")
+    print("  POST /api/voice-turn - Transcribe + chat + TTS in one request")
+    print("  GET /api/tts-status - TTS character budget and availability status")
+    print("  GET /api/tts-budget-stats - TTS character budget windows and scheduling counters")
+    print("  GET /api/reply-cache-stats - Reply cache hit-rate statistics")
+    print("  GET /api/coalescing-stats - Collapsed provider call statistics")
+    print("  GET /api/audio-bank-stats - Pre-rendered audio bank usage")
+    print("  GET /api/tts-format-stats - Bytes served per TTS format")
+    print("  GET /api/admission-stats - Admission control and load shedding")
+    print("  GET /api/trace-stats - Request tracing sample/export counters")
+    print("  GET /api/model-routing-stats - Gemini tier routing and latency")
+    print("  GET /api/tts-prefetch-stats - Prefetched chat reply audio claims")
+    print("  GET /api/assessment-log-stats - Assessment log queue and flush counters")
+    print("  GET /api/idempotency-stats - Idempotency-Key replay statistics")
+    print("  GET /api/loop-lag-stats - Event-loop lag (blocking stacks require PROFILING_TOKEN)")
+    print("  POST /api/admin/profile - Arm the sampling profiler (requires PROFILING_TOKEN)")
     
     # Get port from environment (for Railway, Heroku, etc.) or default to 8000
     port = int(os.getenv("PORT", 8000))
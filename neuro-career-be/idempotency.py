@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from fastapi import Request
+from fastapi.responses import Response
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAY_HEADER = "Idempotency-Replayed"
+# retries should get another chance at these rather than a replay of the failure
+NOT_STORED_STATUSES = {408, 409, 425, 429}
+
+
+class StoredResponse:
+    def __init__(self, status_code, headers, body, media_type):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.media_type = media_type
+
+    def to_response(self, replayed):
+        headers = dict(self.headers)
+        if replayed:
+            headers[REPLAY_HEADER] = "true"
+        return Response(content=self.body, status_code=self.status_code, headers=headers, media_type=self.media_type)
+
+
+class IdempotencyEntry:
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint  # digest of the request content the key was first used with
+        self.future = asyncio.get_running_loop().create_future()
+        self.stored = None
+        self.expires_at = None  # set once the original completes
+
+
+# ------------------ Idempotency keys ------------------
+class IdempotencyStore:
+    """
+    Responses of mutating requests remembered by (method, path, Idempotency-Key).
+
+    The first request with a key runs normally; a retry with the same key either gets the
+    stored response or, if the original is still running, waits for it and gets its
+    response, so provider calls and slot updates happen once. A key reused with different
+    request content (message, session_id, uploaded audio) is refused with 422 instead of
+    replaying another request's response. Successful and 4xx responses
+    are kept for ttl_seconds, bounded by max_entries and max_bytes (oldest evicted first);
+    5xx, 429 and the like are handed to concurrent waiters but not stored, so a later retry
+    runs again.
+    """
+
+    def __init__(self, ttl_seconds=600, max_entries=2000, max_bytes=64 * 1024 * 1024,
+                 max_response_bytes=8 * 1024 * 1024, wait_timeout=120):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_response_bytes = max_response_bytes
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()  # key -> IdempotencyEntry; event loop only, no lock
+        self._bytes = 0
+
+        self.originals = 0
+        self.replayed = 0
+        self.joined_in_flight = 0
+        self.not_stored = 0
+        self.mismatched = 0
+        self.evictions = 0
+
+    def _evict(self, now):
+        """Drop expired responses, then the oldest ones while over the entry/byte bounds"""
+        for key in list(self._entries):
+            entry = self._entries[key]
+            if entry.expires_at is None:
+                continue  # original still running
+            over = len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            if now < entry.expires_at and not over:
+                break  # completed entries are kept in expiry order
+            del self._entries[key]
+            self._bytes -= len(entry.stored.body)
+            self.evictions += 1
+
+    def begin(self, key, fingerprint):
+        """Returns (entry, is_original); entry is None when the key was used for different content"""
+        now = time.monotonic()
+        self._evict(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                self.mismatched += 1
+                return None, False
+            return entry, False
+        entry = IdempotencyEntry(fingerprint)
+        self._entries[key] = entry
+        self.originals += 1
+        return entry, True
+
+    def complete(self, key, entry, stored):
+        """Publish the original's response to waiters, and keep it if it is worth replaying"""
+        if not entry.future.done():
+            entry.future.set_result(stored)
+        keep = (
+            stored is not None
+            and stored.status_code < 500
+            and stored.status_code not in NOT_STORED_STATUSES
+            and len(stored.body) <= self.max_response_bytes
+        )
+        if not keep:
+            self.not_stored += 1
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            return
+        entry.stored = stored
+        entry.expires_at = time.monotonic() + self.ttl_seconds
+        self._entries.move_to_end(key)
+        self._bytes += len(stored.body)
+        self._evict(time.monotonic())
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes_stored": self._bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "originals": self.originals,
+            "replayed": self.replayed,
+            "joined_in_flight": self.joined_in_flight,
+            "not_stored": self.not_stored,
+            "mismatched": self.mismatched,
+            "evictions": self.evictions,
+        }
+
+
+def _replay(body, receive):
+    """An ASGI receive that yields the already-read body once, then defers to the original"""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
+
+
+async def request_fingerprint(request, body) -> str:
+    """
+    Digest of what a request asks for: the parsed JSON body or form fields (which carry
+    message and session_id) and the content of uploaded files. Parsed rather than raw, so
+    a retry with reordered JSON keys or a new multipart boundary still matches.
+    """
+    digest = hashlib.sha256()
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+        form = await Request(request.scope, _replay(body, request.receive)).form()
+        try:
+            for name, value in sorted(form.multi_items(), key=lambda item: item[0]):
+                digest.update(name.encode() + b"\0")
+                if isinstance(value, str):
+                    digest.update(value.encode() + b"\0")
+                else:
+                    digest.update(hashlib.sha256(await value.read()).digest())
+        finally:
+            await form.close()
+        return digest.hexdigest()
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+    except ValueError:
+        pass  # not JSON; hash it as sent
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def idempotency_middleware(store, paths):
+    """
+    Build an http middleware honouring Idempotency-Key on the given POST paths.
+    Requests without the header are untouched. Replays carry Idempotency-Replayed: true.
+    """
+    async def middleware(request, call_next):
+        raw_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if request.method != "POST" or request.url.path not in paths or not raw_key:
+            return await call_next(request)
+        key = (request.method, request.url.path, raw_key[:200])
+
+        # the body is read here to fingerprint it, so the handler gets a request that replays it
+        body = await request.body()
+        fingerprint = await request_fingerprint(request, body)
+        request = Request(request.scope, _replay(body, request.receive))
+
+        entry, is_original = store.begin(key, fingerprint)
+        if entry is None:
+            return Response(
+                content='{"detail":"Idempotency-Key was already used for a different request"}',
+                status_code=422,
+                media_type="application/json",
+            )
+        if not is_original:
+            if entry.stored is not None:
+                store.replayed += 1
+                return entry.stored.to_response(replayed=True)
+            store.joined_in_flight += 1
+            try:
+                stored = await asyncio.wait_for(asyncio.shield(entry.future), timeout=store.wait_timeout)
+            except asyncio.TimeoutError:
+                return Response(
+                    content='{"detail":"Original request with this Idempotency-Key is still running"}',
+                    status_code=409,
+                    media_type="application/json",
+                    headers={"Retry-After": "1"},
+                )
+            if stored is None:
+                return Response(
+                    content='{"detail":"Original request with this Idempotency-Key failed"}',
+                    status_code=500,
+                    media_type="application/json",
+                )
+            return stored.to_response(replayed=True)
+
+        stored = None
+        try:
+            response = await call_next(request)
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in ("content-length", "content-type")}
+            stored = StoredResponse(response.status_code, headers, body, response.headers.get("content-type"))
+            return stored.to_response(replayed=False)
+        finally:
+            store.complete(key, entry, stored)
+
+    return middleware
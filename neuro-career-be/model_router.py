@@ -0,0 +1,179 @@
+import re
+import threading
+import time
+from collections import deque
+
+# Cheap cues that a message answers a given slot (mirrors the keyword fallback in apply_chat_turn)
+SLOT_HINTS = {
+    "Age": [r"\b\d{1,2}\s*(?:years|yrs)\b", r"\b(?:i am|i'm|age)\s+\d{1,2}\b"],
+    "School Class": [r"\b(?:1[0-2]th|grade|class)\b"],
+    "Location": [r"\b(?:city|town|live in|from)\b"],
+    "Interests": [r"\b(?:interest|interested|i like|i love|enjoy)\b"],
+    "Skills": [r"\b(?:skill|good at|i can|coding|python|java|programming)\b"],
+    "Constraints": [r"\b(?:constraint|parents|can't|cannot|need to stay|stay in|budget|afford)\b"],
+    "Values": [r"\b(?:value|values|work-life|work life|helping others|money|balance)\b"],
+    "Prior Exploration": [r"\b(?:hackathon|intern|internship|project|tried|explored|experience)\b"],
+}
+_SLOT_PATTERNS = {slot: [re.compile(p) for p in patterns] for slot, patterns in SLOT_HINTS.items()}
+
+
+def turn_features(message: str, state: dict) -> dict:
+    low = message.lower()
+    return {
+        "words": len(message.split()),
+        "slots_mentioned": sum(1 for patterns in _SLOT_PATTERNS.values() if any(p.search(low) for p in patterns)),
+        "missing_slots": sum(1 for v in state.values() if not v),
+    }
+
+
+class ModelTier:
+    """
+    One Gemini model plus a rolling window of its call latencies.
+    Samples older than sample_ttl seconds no longer count, so a tier that was routed
+    around (and so gets no new samples) stops looking degraded once they age out.
+    """
+
+    def __init__(self, name, model_name, model, degraded_ms, window=20, sample_ttl=120.0):
+        self.name = name
+        self.model_name = model_name
+        self.model = model
+        self.degraded_ms = degraded_ms
+        self.sample_ttl = sample_ttl
+        self.latencies = deque(maxlen=window)  # (timestamp, seconds); failures count as 2x degraded_ms
+        self.last_probe = time.monotonic()
+        self.calls = 0
+        self.errors = 0
+        self.routed = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok=True):
+        with self._lock:
+            self.calls += 1
+            if ok:
+                self.latencies.append((time.monotonic(), seconds))
+            else:
+                self.errors += 1
+                # count a failure as a slow call so a failing tier is routed around
+                self.latencies.append((time.monotonic(), self.degraded_ms / 1000 * 2))
+
+    def _recent(self):
+        """Sorted latencies still inside sample_ttl; call with the lock held"""
+        now = time.monotonic()
+        return sorted(seconds for ts, seconds in self.latencies if now - ts < self.sample_ttl)
+
+    def p50_ms(self):
+        with self._lock:
+            ordered = self._recent()
+        if not ordered:
+            return None
+        return ordered[len(ordered) // 2] * 1000
+
+    def degraded(self) -> bool:
+        with self._lock:
+            ordered = self._recent()
+        return len(ordered) >= 3 and ordered[len(ordered) // 2] * 1000 > self.degraded_ms
+
+    def probe_due(self, interval) -> bool:
+        """True at most once per interval, to send one turn to a degraded tier"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self.last_probe < interval:
+                return False
+            self.last_probe = now
+            return True
+
+    def stats(self) -> dict:
+        p50 = self.p50_ms()
+        with self._lock:
+            ordered = self._recent()
+        return {
+            "model": self.model_name,
+            "routed": self.routed,
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": round(p50, 1) if p50 is not None else None,
+            "p90_ms": round(ordered[int(len(ordered) * 0.9)] * 1000, 1) if ordered else None,
+            "degraded_ms": self.degraded_ms,
+            "degraded": self.degraded(),
+        }
+
+
+# ------------------ Model routing ------------------
+class ModelRouter:
+    """
+    Picks a Gemini tier per chat turn from cheap local features.
+
+    Short turns that touch at most one slot ("yes", "I'm 17") go to the light tier;
+    long messages, messages that answer several slots at once, and the closing turns
+    (few slots left, so the recommendation is near) go to the strong tier. If the
+    chosen tier's rolling median latency is above its degraded_ms (or it keeps failing),
+    the other tier is used instead, and a failed call is retried once on the other tier.
+    A degraded tier still gets one probe turn every probe_interval seconds, so its
+    recovery shows up in the median without waiting for old samples to expire.
+    """
+
+    def __init__(self, light, strong, rich_words=25, rich_slots=2, closing_missing=1, probe_interval=30.0):
+        self.tiers = {"light": light, "strong": strong}
+        self.rich_words = rich_words
+        self.rich_slots = rich_slots
+        self.closing_missing = closing_missing
+        self.probe_interval = probe_interval
+        self.fallbacks = 0
+        self.probes = 0
+
+    def route(self, message: str, state: dict) -> dict:
+        features = turn_features(message, state)
+        if features["words"] >= self.rich_words:
+            tier, reason = "strong", "long message"
+        elif features["slots_mentioned"] >= self.rich_slots:
+            tier, reason = "strong", "multiple slots"
+        elif features["missing_slots"] <= self.closing_missing:
+            tier, reason = "strong", "closing turn"
+        else:
+            tier, reason = "light", "simple turn"
+
+        other = "light" if tier == "strong" else "strong"
+        if self.tiers[tier].degraded() and not self.tiers[other].degraded():
+            if self.tiers[tier].probe_due(self.probe_interval):
+                self.probes += 1
+                reason = f"{reason}; probing degraded {tier}"
+            else:
+                reason = f"{reason}; {tier} degraded"
+                tier = other
+        return {"tier": tier, "reason": reason, **features}
+
+    def generate(self, decision: dict, call):
+        """
+        Run call(tier) on the routed tier, falling back to the other tier once on error.
+        call receives the ModelTier and returns the model response. Returns (response, tier_name).
+        """
+        order = [decision["tier"], "light" if decision["tier"] == "strong" else "strong"]
+        for attempt, name in enumerate(order):
+            tier = self.tiers[name]
+            tier.routed += 1
+            started = time.perf_counter()
+            try:
+                response = call(tier)
+            except Exception as e:
+                tier.record(time.perf_counter() - started, ok=False)
+                print(f"[router] {name} ({tier.model_name}) failed: {e}")
+                if attempt == len(order) - 1:
+                    raise
+                self.fallbacks += 1
+                continue
+            elapsed = time.perf_counter() - started
+            tier.record(elapsed)
+            reason = decision["reason"] if attempt == 0 else f"{decision['reason']}; fallback after error"
+            print(
+                f"[router] tier={name} model={tier.model_name} latency={elapsed * 1000:.0f}ms "
+                f"reason={reason!r} words={decision['words']} "
+                f"slots_mentioned={decision['slots_mentioned']} missing={decision['missing_slots']}"
+            )
+            return response, name
+
+    def stats(self) -> dict:
+        return {
+            "fallbacks": self.fallbacks,
+            "probes": self.probes,
+            "tiers": {name: tier.stats() for name, tier in self.tiers.items()},
+        }
@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import sounddevice as sd
+
+
+# ------------------ Streaming playback ------------------
+class StreamingPlayer:
+    """
+    Plays raw 16-bit PCM straight from a TTS chunk iterator.
+
+    Chunks are decoded as they arrive into a small jitter buffer that feeds a
+    sounddevice OutputStream. Playback starts once prebuffer_ms of audio is queued
+    (or the iterator ends), so the first sound comes out long before synthesis
+    finishes and nothing touches the disk. Buffer underruns play silence instead
+    of stopping the stream.
+    """
+
+    def __init__(self, sample_rate=24000, prebuffer_ms=120, blocksize=1024):
+        self.sample_rate = sample_rate
+        self.prebuffer_samples = int(sample_rate * prebuffer_ms / 1000)
+        self.blocksize = blocksize
+
+        self._lock = threading.Lock()
+        self._buffer = deque()
+        self._buffered = 0
+        self._head_offset = 0
+        self._producer_done = False
+        self._drained = threading.Event()
+        self._stopped = threading.Event()
+        self._stream = None
+
+        self.underruns = 0
+        self.first_audio_latency = None
+        # (time, rms) of recently played blocks: the reference signal for echo rejection
+        self._output_levels = deque(maxlen=64)
+
+    def _callback(self, outdata, frames, time_info, status):
+        if status:
+            print("OutputStream status:", status)
+        out = outdata[:, 0]
+        filled = 0
+        with self._lock:
+            while filled < frames and self._buffer:
+                head = self._buffer[0]
+                take = min(frames - filled, len(head) - self._head_offset)
+                out[filled:filled + take] = head[self._head_offset:self._head_offset + take]
+                filled += take
+                self._head_offset += take
+                self._buffered -= take
+                if self._head_offset >= len(head):
+                    self._buffer.popleft()
+                    self._head_offset = 0
+            producer_done = self._producer_done
+        self._output_levels.append((time.time(), float(np.sqrt(np.mean(np.square(out[:filled]))) if filled else 0.0)))
+        if filled < frames:
+            out[filled:] = 0.0
+            if producer_done:
+                self._drained.set()
+                raise sd.CallbackStop
+            self.underruns += 1
+
+    def _start_stream(self, started_at, sample_rate):
+        if self._stream is None:
+            self._stream = sd.OutputStream(
+                samplerate=sample_rate,
+                channels=1,
+                dtype="float32",
+                blocksize=self.blocksize,
+                callback=self._callback,
+                finished_callback=self._drained.set,
+            )
+            self._stream.start()
+            self.first_audio_latency = time.time() - started_at
+
+    @staticmethod
+    def _decode_pcm(chunk_iter):
+        leftover = b""
+        for chunk in chunk_iter:
+            if not chunk:
+                continue
+            data = leftover + bytes(chunk)
+            # a chunk can end mid-sample; carry the odd byte over to the next one
+            usable = len(data) - (len(data) % 2)
+            leftover = data[usable:]
+            if usable:
+                yield np.frombuffer(data[:usable], dtype="<i2").astype("float32") / 32768.0
+
+    def play(self, chunk_iter) -> bool:
+        """
+        Decode and play raw PCM chunks until the iterator is exhausted and the buffer drains.
+        Returns False if playback was cut short by stop().
+        """
+        try:
+            return self._play(self._decode_pcm(chunk_iter), self.sample_rate)
+        finally:
+            # stop pulling from the provider if we bailed out early
+            close = getattr(chunk_iter, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+    def play_samples(self, samples, sample_rate) -> bool:
+        """Play an already decoded float32 clip through the same stream (so it is interruptible too)"""
+        samples = np.asarray(samples, dtype="float32")
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1)
+        step = self.sample_rate // 4
+        return self._play((samples[i:i + step] for i in range(0, len(samples), step)), sample_rate)
+
+    def _play(self, blocks, sample_rate) -> bool:
+        self._buffer.clear()
+        self._buffered = 0
+        self._head_offset = 0
+        self._producer_done = False
+        self._drained.clear()
+        self._stopped.clear()
+        self._stream = None
+        self.underruns = 0
+        self.first_audio_latency = None
+        prebuffer_samples = int(self.prebuffer_samples * sample_rate / self.sample_rate)
+
+        started_at = time.time()
+        try:
+            for samples in blocks:
+                if self._stopped.is_set():
+                    break
+                with self._lock:
+                    self._buffer.append(samples)
+                    self._buffered += len(samples)
+                    buffered = self._buffered
+                if buffered >= prebuffer_samples:
+                    self._start_stream(started_at, sample_rate)
+
+            with self._lock:
+                self._producer_done = True
+            if not self._stopped.is_set():
+                self._start_stream(started_at, sample_rate)
+                while not self._drained.wait(timeout=0.05):
+                    if self._stopped.is_set():
+                        break
+        finally:
+            if self._stream is not None:
+                try:
+                    if self._stopped.is_set():
+                        self._stream.abort()
+                    else:
+                        self._stream.stop()
+                    self._stream.close()
+                except Exception:
+                    pass
+                self._stream = None
+        return not self._stopped.is_set()
+
+    def output_rms(self, window=0.3) -> float:
+        """Loudest recently played block level, covering output/acoustic delay of about window seconds"""
+        cutoff = time.time() - window
+        levels = [rms for t, rms in list(self._output_levels) if t >= cutoff]
+        return max(levels) if levels else 0.0
+
+    def stop(self):
+        """Abort playback immediately (safe to call from any thread)"""
+        self._stopped.set()
+        with self._lock:
+            self._producer_done = True
+            self._buffer.clear()
+            self._buffered = 0
+        self._drained.set()
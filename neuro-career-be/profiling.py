@@ -0,0 +1,226 @@
+import asyncio
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+def _is_idle(frame):
+    """Threadpool workers parked on their queue carry no information"""
+    code = frame.f_code
+    if code.co_name == "_worker" and code.co_filename.endswith(os.path.join("futures", "thread.py")):
+        return True  # blocked in work_queue.get()
+    return code.co_name in ("wait", "_wait_for_tstate_lock") and code.co_filename.endswith("threading.py")
+
+
+# ------------------ Sampling profiler ------------------
+class ProfileSession:
+    def __init__(self, label):
+        self.label = label
+        self.started = time.time()
+        self.stacks = Counter()
+        self.samples = 0
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: while any session is active, a daemon thread snapshots every
+    thread's stack (sys._current_frames) each `interval` seconds. The event-loop thread
+    shows blocking calls made directly in async handlers, worker threads show the
+    run_in_threadpool work. Stacks are written in collapsed ("folded") format, one
+    "root;caller;callee count" line per stack, which flamegraph.pl and speedscope read
+    directly. Concurrent requests share the sampled threads, so profile under low load
+    for clean attribution.
+    """
+
+    def __init__(self, out_dir, interval=0.005, max_seconds=60):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.armed = 0  # requests still to profile, set via the admin endpoint
+        self.armed_path = None
+        self.written = []
+
+    def arm(self, requests, path=None):
+        with self._lock:
+            self.armed = requests
+            self.armed_path = path
+
+    def take_armed(self, path) -> bool:
+        with self._lock:
+            if self.armed > 0 and (self.armed_path is None or self.armed_path == path):
+                self.armed -= 1
+                return True
+            return False
+
+    def start(self, label) -> ProfileSession:
+        session = ProfileSession(label)
+        with self._lock:
+            self._sessions.add(session)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return session
+
+    def stop(self, session) -> str:
+        with self._lock:
+            self._sessions.discard(session)
+        return self._write(session)
+
+    def _run(self):
+        skip = {threading.get_ident()}
+        while True:
+            with self._lock:
+                sessions = [s for s in self._sessions if time.time() - s.started < self.max_seconds]
+                if not self._sessions:
+                    self._thread = None
+                    return
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident in skip or _is_idle(frame) or names.get(ident) == "loop-lag-watchdog":
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, str(ident)))
+                stacks.append(";".join(reversed(labels)))
+            for session in sessions:
+                session.samples += 1
+                session.stacks.update(stacks)
+            time.sleep(self.interval)
+
+    def _write(self, session) -> str:
+        os.makedirs(self.out_dir, exist_ok=True)
+        safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", session.label).strip("_")[:80]
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(session.started))
+        millis = int(session.started * 1000) % 1000
+        path = os.path.join(self.out_dir, f"{stamp}.{millis:03d}-{safe}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in session.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with self._lock:
+            self.written = (self.written + [path])[-50:]
+        print(f"Profile written: {path} ({session.samples} samples)")
+        return path
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "out_dir": self.out_dir,
+                "interval_ms": self.interval * 1000,
+                "active_sessions": len(self._sessions),
+                "armed_requests": self.armed,
+                "armed_path": self.armed_path,
+                "recent_profiles": list(self.written),
+            }
+
+
+def profiling_middleware(profiler, token):
+    """
+    Profile a request when it carries `X-Profile: <token>` or when the admin endpoint armed
+    the profiler. Disabled entirely unless a token is configured. The output file name is
+    returned in X-Profile-File.
+    """
+    async def middleware(request, call_next):
+        wanted = bool(token) and (
+            hmac.compare_digest(request.headers.get("x-profile", "").encode(), token.encode())
+            or profiler.take_armed(request.url.path)
+        )
+        if not wanted:
+            return await call_next(request)
+        session = profiler.start(f"{request.method}-{request.url.path}")
+        try:
+            response = await call_next(request)
+        finally:
+            path = await asyncio.get_running_loop().run_in_executor(None, profiler.stop, session)
+        response.headers["X-Profile-File"] = os.path.basename(path)
+        return response
+
+    return middleware
+
+
+# ------------------ Event-loop lag monitor ------------------
+class LoopLagMonitor:
+    """
+    Always-on detector for code that blocks the event loop (sync SDK calls inside async def).
+
+    A heartbeat coroutine wakes every `interval` and records how late it woke (the lag).
+    A watchdog thread checks the heartbeat; once the loop has been stuck longer than
+    `threshold`, it logs the event-loop thread's current stack, i.e. the blocking code,
+    once per stall.
+    """
+
+    def __init__(self, interval=0.1, threshold=0.25):
+        self.interval = interval
+        self.threshold = threshold
+        self._loop_thread = None
+        self._last_beat = time.perf_counter()
+        self._reported_beat = None
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.beats = 0
+        self.stalls = 0
+        self.last_stall = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - expected)
+            self.beats += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            self._last_beat = now
+
+    def _watchdog(self):
+        while True:
+            time.sleep(self.interval / 2)
+            beat = self._last_beat
+            stalled = time.perf_counter() - beat
+            if stalled < self.threshold + self.interval or self._reported_beat == beat:
+                continue
+            self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            self.stalls += 1
+            self.last_stall = {"at": time.time(), "stalled_ms": round(stalled * 1000, 1), "stack": stack}
+            print(f"Event loop blocked for {stalled * 1000:.0f}ms+ in:\n{stack}")
+
+    def start(self):
+        """Call from inside the running loop (app startup)"""
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name="loop-lag-watchdog", daemon=True).start()
+
+    def stats(self, include_stack=False) -> dict:
+        """The last stall's stack reveals code paths, so it is only included on request"""
+        last_stall = self.last_stall
+        if last_stall is not None and not include_stack:
+            last_stall = {k: v for k, v in last_stall.items() if k != "stack"}
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "beats": self.beats,
+            "avg_lag_ms": round(self.total_lag / self.beats * 1000, 2) if self.beats else 0.0,
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "stalls": self.stalls,
+            "last_stall": last_stall,
+        }
@@ -0,0 +1,126 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Greetings / session starters / bare acknowledgements: the only turns cached. They carry no
+# personal data, unlike short answers such as "I'm 17" or "I live in Pune".
+CACHEABLE_PHRASES = frozenset({
+    "hi", "hello", "hey", "hi there", "hello there", "hey there",
+    "good morning", "good afternoon", "good evening",
+    "start", "begin", "let's start", "lets start", "let's begin", "lets begin",
+    "ok let's start", "okay let's start", "ready", "i'm ready", "im ready",
+    "yes", "yeah", "yep", "no", "nope", "ok", "okay", "sure", "thanks", "thank you",
+})
+
+
+# ------------------ Reply cache ------------------
+class ReplyCache:
+    """
+    Bounded LRU cache of assistant replies for repeated student turns.
+
+    Only messages on an explicit allow-list of greetings and acknowledgements are
+    cached (CACHEABLE_PHRASES), so a student's own answers never are. Because the
+    prompt carries every slot value and the reply may quote them, entries are keyed
+    on the normalized message plus a digest of the slot values and of the conversation
+    context (the rendered history block), so "yes" only replays a reply given to the
+    same previous question in the same state; in practice the hits are opening turns
+    of fresh sessions, which repeat across every session.
+    """
+
+    def __init__(self, max_size=256, ttl_seconds=1800, phrases=CACHEABLE_PHRASES):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.phrases = phrases
+        self._entries = OrderedDict()  # key -> (expires_at, reply)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.skipped = 0
+
+    @staticmethod
+    def normalize_message(message: str) -> str:
+        """Lowercase, strip punctuation and collapse whitespace"""
+        low = (message or "").lower().replace("’", "'")
+        low = re.sub(r"[^\w\s']", " ", low)
+        return " ".join(low.split())
+
+    @staticmethod
+    def state_signature(state: dict) -> str:
+        """Digest of the filled slots and their values, in state order"""
+        filled = "\x1f".join(f"{k}={v}" for k, v in state.items() if v)
+        return hashlib.sha1(filled.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, message: str) -> bool:
+        return self.normalize_message(message) in self.phrases
+
+    def make_key(self, message: str, state: dict, context: str = ""):
+        context_digest = hashlib.sha1(context.encode("utf-8")).hexdigest() if context else ""
+        return (self.normalize_message(message), self.state_signature(state), context_digest)
+
+    def get(self, message: str, state: dict, context: str = ""):
+        """Return a copy of the cached {"slots", "response"} pair, or None"""
+        if not self.is_cacheable(message):
+            self.skipped += 1
+            return None
+
+        key = self.make_key(message, state, context)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, reply = entry
+            if now >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return {"slots": dict(reply["slots"]), "response": reply["response"]}
+
+    def put(self, message: str, state: dict, reply: dict, context: str = ""):
+        """Store a successfully parsed model reply"""
+        if not self.is_cacheable(message) or not isinstance(reply, dict):
+            return
+        slots = reply.get("slots") or {}
+        if not isinstance(slots, dict) or not reply.get("response"):
+            return
+
+        key = self.make_key(message, state, context)
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + self.ttl_seconds,
+                {"slots": dict(slots), "response": reply["response"]},
+            )
+            self._entries.move_to_end(key)
+            self.stores += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "skipped_uncacheable": self.skipped,
+        }
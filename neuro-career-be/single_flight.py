@@ -0,0 +1,79 @@
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+# ------------------ Single-flight request coalescing ------------------
+class SingleFlight:
+    """
+    Collapses identical concurrent provider calls into one upstream call.
+
+    The first caller for a key (the leader) runs fn(); callers arriving with the
+    same key while it is in flight block until it finishes and receive the same
+    result (or the same exception). Nothing is cached once the call completes,
+    so this only dedupes work that genuinely overlaps in time.
+
+    Thread-based so it works from worker threads and, via run_in_threadpool,
+    from async FastAPI handlers.
+    """
+
+    def __init__(self, name="single-flight"):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        self.upstream_calls = 0
+        self.collapsed_calls = 0
+        self.per_kind = {}  # kind -> {"upstream": n, "collapsed": n}
+
+    def do(self, key, fn, kind="default"):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.upstream_calls += 1
+            else:
+                call.waiters += 1
+                self.collapsed_calls += 1
+            counters = self.per_kind.setdefault(kind, {"upstream": 0, "collapsed": 0})
+            counters["upstream" if leader else "collapsed"] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+            if call.waiters:
+                print(f"[{self.name}] {kind}: 1 upstream call served {call.waiters + 1} requests")
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> dict:
+        total = self.upstream_calls + self.collapsed_calls
+        return {
+            "upstream_calls": self.upstream_calls,
+            "collapsed_calls": self.collapsed_calls,
+            "collapse_rate": round(self.collapsed_calls / total, 4) if total else 0.0,
+            "in_flight": self.in_flight(),
+            "per_kind": {k: dict(v) for k, v in self.per_kind.items()},
+        }
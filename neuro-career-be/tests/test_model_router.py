@@ -0,0 +1,87 @@
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_router
+from model_router import ModelRouter, ModelTier
+
+SIMPLE_STATE = {"Age": None, "Interests": None, "Skills": None}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def make_router(monkeypatch, sample_ttl=120, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr(model_router, "time", types.SimpleNamespace(
+        monotonic=clock.monotonic, perf_counter=model_router.time.perf_counter,
+    ))
+    light = ModelTier("light", "light-model", None, degraded_ms=1000, sample_ttl=sample_ttl)
+    strong = ModelTier("strong", "strong-model", None, degraded_ms=5000, sample_ttl=sample_ttl)
+    return ModelRouter(light, strong, **kwargs), clock
+
+
+def test_slow_tier_is_routed_around(monkeypatch):
+    router, _ = make_router(monkeypatch)
+    for _ in range(3):
+        router.tiers["light"].record(3.0)
+    decision = router.route("yes", SIMPLE_STATE)
+    assert decision["tier"] == "strong"
+    assert "light degraded" in decision["reason"]
+
+
+def test_degradation_expires_with_old_samples(monkeypatch):
+    router, clock = make_router(monkeypatch, probe_interval=10_000)
+    for _ in range(3):
+        router.tiers["light"].record(3.0)
+    assert router.tiers["light"].degraded()
+
+    clock.now += 121
+    assert not router.tiers["light"].degraded()
+    assert router.route("yes", SIMPLE_STATE)["tier"] == "light"
+
+
+def test_probe_lets_degraded_tier_recover(monkeypatch):
+    # long sample_ttl: recovery has to come from the probes, not from expiry
+    router, clock = make_router(monkeypatch, sample_ttl=3600, probe_interval=30)
+    light = router.tiers["light"]
+    for _ in range(3):
+        light.record(3.0)
+
+    assert router.route("yes", SIMPLE_STATE)["tier"] == "strong"  # probe not due yet
+    recovered = False
+    for _ in range(5):
+        clock.now += 30
+        decision = router.route("yes", SIMPLE_STATE)
+        if decision["tier"] != "light":
+            break
+        assert "probing" in decision["reason"]
+        light.record(0.2)  # the probe came back fast
+        if not light.degraded():
+            recovered = True
+            break
+    assert recovered
+    assert router.route("yes", SIMPLE_STATE)["tier"] == "light"
+    assert router.probes >= 1
+
+
+def test_failures_count_as_slow_calls(monkeypatch):
+    router, _ = make_router(monkeypatch)
+
+    def call(tier):
+        if tier.name == "light":
+            raise RuntimeError("boom")
+        return "ok"
+
+    for _ in range(3):
+        response, tier = router.generate(router.route("yes", SIMPLE_STATE), call)
+        assert (response, tier) == ("ok", "strong")
+    assert router.tiers["light"].degraded()
+    assert router.fallbacks >= 1
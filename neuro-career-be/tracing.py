@@ -0,0 +1,211 @@
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+REQUEST_ID_HEADERS = ("x-request-id", "x-correlation-id")
+
+
+class Trace:
+    """Spans collected for one HTTP request; request_id is shared by every request of a turn"""
+
+    def __init__(self, request_id, name):
+        self.request_id = request_id
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self.attrs = {}
+        self._lock = threading.Lock()  # spans are added from worker threads too
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_record(self, duration_ms) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {
+            "request_id": self.request_id,
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": round(self.started_at, 3),
+            "duration_ms": round(duration_ms, 2),
+            "attrs": self.attrs,
+            "spans": spans,
+        }
+
+
+def current_request_id():
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def set_attr(key, value):
+    """Annotate the current request's trace (e.g. session_id, status)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs[key] = value
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time a block as a child of the current span. No-op outside a traced request.
+    Works across run_in_threadpool since the worker thread runs in a copy of the context.
+    Yields the attrs dict so the block can add results (e.g. chars, cache_hit).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield attrs
+        return
+    span_id = uuid.uuid4().hex[:8]
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        record = {
+            "name": name,
+            "span_id": span_id,
+            "parent_id": parent,
+            "start_ms": round((start - trace.t0) * 1000, 2),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            "thread": threading.current_thread().name,
+        }
+        if attrs:
+            record["attrs"] = attrs
+        if error:
+            record["error"] = error[:300]
+        trace.add(record)
+
+
+# ------------------ Trace sink ------------------
+class Tracer:
+    """
+    Decides which finished traces to keep and appends them as JSON lines to sink_path.
+
+    A trace is exported when it was head-sampled (sample_rate), when it took longer than
+    slow_ms, or when the request failed, so slow turns are always available for
+    reconstructing the critical path. Kept traces are queued and written by a background
+    thread, so the event loop never waits on the file. The file is rotated to
+    <sink_path>.1 at max_bytes; traces arriving while max_queue are pending are dropped.
+    """
+
+    def __init__(self, sink_path, sample_rate=0.1, slow_ms=2000, max_bytes=20 * 1024 * 1024, max_queue=1000):
+        self.sink_path = sink_path
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.started = 0
+        self.exported = 0
+        self.dropped = 0
+        self.export_dropped = 0
+
+    def start(self, name, request_id=None) -> Trace:
+        self.started += 1
+        trace = Trace(request_id or uuid.uuid4().hex, name)
+        _current_trace.set(trace)
+        _current_span.set(None)
+        return trace
+
+    def finish(self, trace, status_code):
+        duration_ms = (time.perf_counter() - trace.t0) * 1000
+        trace.attrs["status"] = status_code
+        keep = (
+            duration_ms >= self.slow_ms
+            or status_code >= 500
+            or random.random() < self.sample_rate
+        )
+        if not keep:
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait(trace.to_record(duration_ms))
+        except queue.Full:
+            self.export_dropped += 1
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._export, name="trace-export", daemon=True)
+                self._thread.start()
+
+    def _export(self):
+        while True:
+            records = [self._queue.get()]
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = "".join(json.dumps(record, default=str) + "\n" for record in records)
+            try:
+                if os.path.exists(self.sink_path) and os.path.getsize(self.sink_path) >= self.max_bytes:
+                    os.replace(self.sink_path, self.sink_path + ".1")
+                with open(self.sink_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                self.exported += len(records)
+            except OSError as e:
+                self.export_dropped += len(records)
+                print(f"Trace export failed: {e}")
+            for _ in records:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued trace has been written (tests, shutdown)"""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        return {
+            "sink_path": self.sink_path,
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "started": self.started,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "export_queued": self._queue.qsize(),
+            "export_dropped": self.export_dropped,
+        }
+
+
+def tracing_middleware(tracer):
+    """
+    Build an http middleware that opens a trace per request. The correlation ID comes from
+    X-Request-ID / X-Correlation-ID when the client sends one (so transcribe, chat and TTS of
+    one turn share it) and is echoed back in X-Request-ID either way.
+    """
+    async def middleware(request, call_next):
+        request_id = None
+        for header in REQUEST_ID_HEADERS:
+            request_id = request.headers.get(header)
+            if request_id:
+                break
+        trace = tracer.start(f"{request.method} {request.url.path}", request_id[:128] if request_id else None)
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            response.headers["X-Request-ID"] = trace.request_id
+            return response
+        finally:
+            tracer.finish(trace, status_code)
+
+    return middleware
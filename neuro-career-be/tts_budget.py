@@ -0,0 +1,297 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+
+class BudgetExceeded(Exception):
+    """Raised by admit() when a synthesis can't be paid for; retry_after is in seconds (None if unknown)"""
+
+    def __init__(self, reason, retry_after=None, downgraded=False):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.downgraded = downgraded  # low-priority request sent to the browser-speech fallback
+
+
+class ProviderBlocked(Exception):
+    """The provider refused a call (quota, rate limit, abuse detection); the block is already recorded"""
+
+
+class BudgetWindow:
+    """Rolling character budget: at most max_chars synthesized in any `seconds` span"""
+
+    def __init__(self, name, seconds, max_chars):
+        self.name = name
+        self.seconds = seconds
+        self.max_chars = max_chars
+        self.spends = deque()  # (timestamp, chars), oldest first
+        self.spent = 0
+
+    def expire(self, now):
+        while self.spends and now - self.spends[0][0] >= self.seconds:
+            _, chars = self.spends.popleft()
+            self.spent -= chars
+
+    def remaining(self) -> int:
+        return max(0, self.max_chars - self.spent)
+
+    def time_until_free(self, chars, now):
+        """Seconds until `chars` more fit as old spends age out; None if they never will"""
+        if chars > self.max_chars:
+            return None
+        need = chars - self.remaining()
+        if need <= 0:
+            return 0.0
+        freed = 0
+        for ts, spent in self.spends:
+            freed += spent
+            if freed >= need:
+                return max(0.0, ts + self.seconds - now)
+        return None
+
+    def time_until_refill(self, now):
+        """Seconds until the oldest spend ages out and the window starts refilling; None if empty"""
+        if not self.spends:
+            return None
+        return max(0.0, self.spends[0][0] + self.seconds - now)
+
+
+# ------------------ Character budget scheduler ------------------
+class CharacterBudgetScheduler:
+    """
+    ElevenLabs bills and throttles by characters, so quota is tracked as character spend
+    against several rolling windows (e.g. per minute / hour / day) instead of request counts.
+
+    Synthesis reserves its characters up front and commits or refunds them afterwards, so
+    concurrent requests can't overspend. High-priority speech (the reply the user is waiting
+    for) may use the whole budget and waits up to max_wait for a short window to free up.
+    Low-priority speech is downgraded to the browser-speech fallback when it would dip into
+    the reserve kept for high priority, or, once a window is below burn_guard of its budget,
+    when the recent burn rate predicts it will run dry before its oldest spends age out.
+
+    Provider-side blocks (a 429 or quota error from ElevenLabs despite our accounting) start a
+    cooldown that doubles on each repeat, instead of a fixed lockout.
+    """
+
+    PRIORITIES = ("high", "low")
+
+    def __init__(
+        self,
+        windows,
+        low_priority_reserve=0.2,
+        burn_guard=0.5,
+        max_wait=2.0,
+        burn_rate_window=300,
+        min_cooldown=60,
+        max_cooldown=24 * 3600,
+    ):
+        self.windows = [BudgetWindow(name, seconds, max_chars) for name, seconds, max_chars in windows]
+        self.low_priority_reserve = low_priority_reserve
+        self.burn_guard = burn_guard
+        self.max_wait = max_wait
+        self.burn_rate_window = burn_rate_window
+        self.min_cooldown = min_cooldown
+        self.max_cooldown = max_cooldown
+
+        self._recent = deque()  # (timestamp, chars) for the burn rate
+        self._recent_chars = 0
+        self._lock = threading.Lock()
+        self.cooldown_until = 0.0
+        self._next_cooldown = min_cooldown
+        self.block_reason = None
+
+        self.granted = 0
+        self.queued = 0
+        self.downgraded = 0
+        self.rejected = 0
+        self.chars_spent = 0
+        self.chars_refunded = 0
+        self.avg_request_chars = 200.0  # EMA of granted request sizes, for requests_remaining
+
+    def _expire(self, now):
+        for window in self.windows:
+            window.expire(now)
+        while self._recent and now - self._recent[0][0] >= self.burn_rate_window:
+            _, chars = self._recent.popleft()
+            self._recent_chars -= chars
+
+    def _burn_rate(self) -> float:
+        """Characters per second over the recent window"""
+        return self._recent_chars / self.burn_rate_window
+
+    def _exhaustion_eta(self, window, burn_rate):
+        return window.remaining() / burn_rate if burn_rate > 0 else None
+
+    def _runs_dry(self, window, burn_rate, now) -> bool:
+        """True when a low window's burn rate empties it before its oldest spends free anything"""
+        if window.remaining() >= self.burn_guard * window.max_chars:
+            return False
+        eta = self._exhaustion_eta(window, burn_rate)
+        refill = window.time_until_refill(now)
+        return eta is not None and refill is not None and eta < refill
+
+    def _check(self, chars, priority, now):
+        """Returns ("grant", None), ("wait", seconds) or ("deny", (reason, retry_after, downgraded))"""
+        if now < self.cooldown_until:
+            return "deny", (f"ElevenLabs blocked ({self.block_reason}), cooling down", self.cooldown_until - now, False)
+
+        burn_rate = self._burn_rate()
+        wait = 0.0
+        for window in self.windows:
+            free_in = window.time_until_free(chars, now)
+            if free_in is None:
+                return "deny", (f"{chars} characters exceed the {window.name} budget", None, False)
+            wait = max(wait, free_in)
+            if priority == "low":
+                reserve = self.low_priority_reserve * window.max_chars
+                if window.remaining() - chars < reserve or self._runs_dry(window, burn_rate, now):
+                    return "deny", (f"{window.name} character budget reserved for replies", free_in or None, True)
+
+        if wait == 0.0:
+            return "grant", None
+        if wait <= self.max_wait:
+            return "wait", wait
+        return "deny", ("ElevenLabs character budget exhausted", wait, False)
+
+    def has_headroom(self, chars) -> bool:
+        """True when chars fit now without dipping into any window's low-priority reserve"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.cooldown_until:
+                return False
+            self._expire(now)
+            return all(
+                window.remaining() - chars >= self.low_priority_reserve * window.max_chars
+                for window in self.windows
+            )
+
+    async def admit(self, chars, priority="high"):
+        """Reserve chars for one provider call; returns a reservation for commit()/refund()"""
+        if priority not in self.PRIORITIES:
+            priority = "high"
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                decision, detail = self._check(chars, priority, now)
+                if decision == "grant":
+                    self._spend(chars, now)
+                    self.granted += 1
+                    return (now, chars)
+                if decision == "wait" and now + detail > deadline:
+                    decision, detail = "deny", ("ElevenLabs character budget exhausted", detail, False)
+                if decision == "deny":
+                    reason, retry_after, downgraded = detail
+                    if downgraded:
+                        self.downgraded += 1
+                    else:
+                        self.rejected += 1
+                    raise BudgetExceeded(reason, retry_after, downgraded)
+                if not waited:
+                    self.queued += 1
+                    waited = True
+            await asyncio.sleep(detail + 0.01)
+
+    def _spend(self, chars, now):
+        for window in self.windows:
+            window.spends.append((now, chars))
+            window.spent += chars
+        self._recent.append((now, chars))
+        self._recent_chars += chars
+        self.chars_spent += chars
+        self.avg_request_chars += 0.1 * (chars - self.avg_request_chars)
+
+    @staticmethod
+    def _shrink(spends, ts, reserved, chars) -> bool:
+        """Take chars off the (ts, reserved) spend, dropping it once empty; False if it already aged out"""
+        try:
+            index = spends.index((ts, reserved))
+        except ValueError:
+            return False
+        if chars >= reserved:
+            del spends[index]
+        else:
+            spends[index] = (ts, reserved - chars)
+        return True
+
+    def refund(self, reservation, chars=None):
+        """
+        Give back a reservation whose provider call failed or was served by another request.
+        chars gives back only part of it (e.g. the chunks of a reply that never reached the
+        provider); a reservation can be refunded once.
+        """
+        ts, reserved = reservation
+        chars = reserved if chars is None else min(chars, reserved)
+        if chars <= 0:
+            return
+        with self._lock:
+            for window in self.windows:
+                if self._shrink(window.spends, ts, reserved, chars):
+                    window.spent -= chars
+            if self._shrink(self._recent, ts, reserved, chars):
+                self._recent_chars -= chars
+            self.chars_spent -= chars
+            self.chars_refunded += chars
+
+    def commit(self, reservation):
+        """A successful provider call resets the cooldown backoff"""
+        with self._lock:
+            self._next_cooldown = self.min_cooldown
+            self.block_reason = None
+
+    def record_provider_block(self, reason, hard=False):
+        """
+        ElevenLabs refused us; back off (doubling per repeat, or max_cooldown for abuse/disabled).
+        Blocks reported while a cooldown is already running came from calls that were in flight
+        when it started (e.g. sibling chunks of one reply), so they don't double it again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            remaining = self.cooldown_until - now
+            # a hard block still escalates a shorter cooldown that is running
+            if remaining > 0 and (not hard or remaining >= self.max_cooldown - 1):
+                return remaining
+            cooldown = self.max_cooldown if hard else self._next_cooldown
+            self._next_cooldown = min(self.max_cooldown, self._next_cooldown * 2)
+            self.cooldown_until = now + cooldown
+            self.block_reason = reason
+        print(f"ElevenLabs blocked ({reason}), pausing TTS for {cooldown:.0f}s")
+        return cooldown
+
+    def status(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            burn_rate = self._burn_rate()
+            budgets = []
+            for window in self.windows:
+                eta = self._exhaustion_eta(window, burn_rate)
+                budgets.append({
+                    "window": window.name,
+                    "seconds": window.seconds,
+                    "max_characters": window.max_chars,
+                    "characters_used": window.spent,
+                    "characters_remaining": window.remaining(),
+                    "predicted_exhaustion_seconds": round(eta, 1) if eta is not None else None,
+                })
+            cooldown = max(0.0, self.cooldown_until - now)
+            tightest = min((w.remaining() for w in self.windows), default=0)
+            return {
+                "available": cooldown == 0 and all(w.remaining() > 0 for w in self.windows),
+                "characters_remaining": tightest,
+                # rough count of typical-sized requests the tightest window still allows
+                "requests_remaining": int(tightest // max(self.avg_request_chars, 1.0)),
+                "burn_rate_chars_per_minute": round(burn_rate * 60, 1),
+                "cooldown_seconds": round(cooldown, 1),
+                "block_reason": self.block_reason if cooldown else None,
+                "budgets": budgets,
+                "granted": self.granted,
+                "queued": self.queued,
+                "downgraded": self.downgraded,
+                "rejected": self.rejected,
+                "chars_spent": self.chars_spent,
+                "chars_refunded": self.chars_refunded,
+            }
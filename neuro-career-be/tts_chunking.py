@@ -0,0 +1,93 @@
+import math
+import re
+
+SENTENCE_BREAK = re.compile(r"(?<=[.!?…])[\"')\]]*\s+|\n+")
+CLAUSE_BREAK = re.compile(r"(?<=[,;:—–])\s+|\s+(?=[—–-]\s)")
+
+
+# ------------------ Splitting ------------------
+def _pieces(text, pattern):
+    return [p.strip() for p in pattern.split(text) if p and p.strip()]
+
+
+def _split_long(sentence, max_chars):
+    """Break one over-long sentence at clause boundaries, then at word boundaries"""
+    if len(sentence) <= max_chars:
+        return [sentence]
+    parts = []
+    for clause in _pieces(sentence, CLAUSE_BREAK):
+        if len(clause) <= max_chars:
+            parts.append(clause)
+            continue
+        words, current = clause.split(), ""
+        for word in words:
+            if current and len(current) + 1 + len(word) > max_chars:
+                parts.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        if current:
+            parts.append(current)
+    return parts
+
+
+def split_for_synthesis(text, max_chars=250, max_chunks=4, min_chunk_chars=80):
+    """
+    Split text into at most max_chunks pieces at sentence (then clause) boundaries.
+
+    Chunks are packed towards an even size (len / max_chunks, but no smaller than
+    min_chunk_chars and no larger than max_chars). Parallel synthesis finishes when the
+    longest chunk does, so balanced chunks matter more than a fixed chunk length.
+    Returns [text] when the text is short enough to synthesize in one call.
+    """
+    text = text.strip()
+    if len(text) <= max(min_chunk_chars * 2, 1):
+        return [text]
+
+    target = min(max_chars, max(min_chunk_chars, math.ceil(len(text) / max_chunks)))
+    units = []
+    for sentence in _pieces(text, SENTENCE_BREAK):
+        units.extend(_split_long(sentence, target))
+
+    chunks, current = [], ""
+    for unit in units:
+        if current and len(current) + 1 + len(unit) > target:
+            chunks.append(current)
+            current = unit
+        else:
+            current = f"{current} {unit}" if current else unit
+    if current:
+        chunks.append(current)
+
+    # more pieces than we may run at once (many short clauses): merge the smallest neighbours
+    while len(chunks) > max_chunks:
+        i = min(range(len(chunks) - 1), key=lambda j: len(chunks[j]) + len(chunks[j + 1]))
+        chunks[i:i + 2] = [f"{chunks[i]} {chunks[i + 1]}"]
+    return chunks
+
+
+# ------------------ Stitching ------------------
+def _strip_id3(mp3, keep_head):
+    """Drop ID3v2 header (unless keep_head) and ID3v1 trailer so frames concatenate cleanly"""
+    start = 0
+    if not keep_head and len(mp3) >= 10 and mp3[:3] == b"ID3":
+        size = (mp3[6] << 21) | (mp3[7] << 14) | (mp3[8] << 7) | mp3[9]
+        start = 10 + size + (10 if mp3[5] & 0x10 else 0)
+    end = len(mp3)
+    if end - start >= 128 and mp3[end - 128:end - 125] == b"TAG":
+        end -= 128
+    return mp3[start:end]
+
+
+def stitch_audio(chunks, output_format):
+    """
+    Join per-chunk provider audio, in order, into one stream.
+
+    pcm_*: raw 16-bit samples, concatenated directly.
+    mp3_*: MPEG frames concatenate into a valid stream once per-chunk ID3 tags are removed.
+    """
+    if output_format.startswith("pcm_"):
+        return b"".join(chunk[:len(chunk) - (len(chunk) % 2)] for chunk in chunks)
+    if output_format.startswith("mp3_"):
+        return b"".join(_strip_id3(chunk, keep_head=(i == 0)) for i, chunk in enumerate(chunks))
+    raise ValueError(f"Can't stitch {output_format} audio")
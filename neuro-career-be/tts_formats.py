@@ -0,0 +1,195 @@
+import io
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+
+# ------------------ Output formats ------------------
+# Per format and bitrate tier: how to get it from ElevenLabs.
+#  - mp3 is requested directly (provider output_format)
+#  - pcm/wav/opus are derived from a raw 16-bit PCM master at the tier's sample rate;
+#    wav wraps it in a header and opus is encoded locally with libsndfile. Formats whose
+#    tiers use the same rate share one provider call (and one cached master) per text:
+#    pcm/wav/opus at low (16 kHz) and high (24 kHz). Standard opus needs 24 kHz because
+#    libsndfile's Opus encoder rejects 22050, so it doesn't share with standard pcm/wav.
+TTS_FORMATS = {
+    "mp3": {
+        "media_type": "audio/mpeg",
+        "extension": "mp3",
+        "tiers": {
+            "low": {"provider_format": "mp3_22050_32"},
+            "standard": {"provider_format": "mp3_44100_128"},  # ElevenLabs default
+            "high": {"provider_format": "mp3_44100_192"},
+        },
+    },
+    "pcm": {
+        "media_type": "audio/L16",
+        "extension": "pcm",
+        "tiers": {
+            "low": {"sample_rate": 16000},
+            "standard": {"sample_rate": 22050},
+            "high": {"sample_rate": 24000},
+        },
+    },
+    "wav": {
+        "media_type": "audio/wav",
+        "extension": "wav",
+        "tiers": {
+            "low": {"sample_rate": 16000},
+            "standard": {"sample_rate": 22050},
+            "high": {"sample_rate": 24000},
+        },
+    },
+    "opus": {
+        "media_type": "audio/ogg; codecs=opus",
+        "extension": "ogg",
+        "tiers": {
+            # compression_level: 0 = highest bitrate, 1 = smallest output
+            "low": {"sample_rate": 16000, "compression_level": 0.9},
+            "standard": {"sample_rate": 24000, "compression_level": 0.6},
+            "high": {"sample_rate": 24000, "compression_level": 0.2},
+        },
+    },
+}
+DEFAULT_FORMAT = "mp3"
+DEFAULT_TIER = "standard"
+
+
+class TTSVariant:
+    """A resolved (format, tier) pair and what to ask the provider for"""
+
+    def __init__(self, fmt: str, tier: str):
+        spec = TTS_FORMATS[fmt]
+        tier_spec = spec["tiers"][tier]
+        self.format = fmt
+        self.tier = tier
+        self.extension = spec["extension"]
+        self.sample_rate = tier_spec.get("sample_rate")
+        self.compression_level = tier_spec.get("compression_level")
+        # derived formats are built from the PCM master at the same rate
+        self.provider_format = tier_spec.get("provider_format") or f"pcm_{self.sample_rate}"
+        self.media_type = spec["media_type"]
+        if fmt == "pcm":
+            self.media_type = f"audio/L16; rate={self.sample_rate}; channels=1"
+
+    @property
+    def is_derived(self) -> bool:
+        return self.format in ("wav", "opus")
+
+    @property
+    def key(self) -> str:
+        return f"{self.format}:{self.tier}"
+
+
+def resolve_variant(fmt=None, tier=None) -> TTSVariant:
+    """Normalize client-requested format/tier; raises ValueError for unsupported values"""
+    fmt = (fmt or DEFAULT_FORMAT).strip().lower()
+    tier = (tier or DEFAULT_TIER).strip().lower()
+    if fmt in ("mpeg", "mp3"):
+        fmt = "mp3"
+    elif fmt in ("ogg", "opus"):
+        fmt = "opus"
+    elif fmt in ("raw", "pcm", "l16"):
+        fmt = "pcm"
+    if fmt not in TTS_FORMATS:
+        raise ValueError(f"Unsupported audio format '{fmt}'. Use one of: {', '.join(TTS_FORMATS)}")
+    if tier not in TTS_FORMATS[fmt]["tiers"]:
+        raise ValueError(f"Unsupported quality '{tier}'. Use one of: {', '.join(TTS_FORMATS[fmt]['tiers'])}")
+    return TTSVariant(fmt, tier)
+
+
+def encode_from_pcm(pcm_bytes: bytes, variant: TTSVariant) -> bytes:
+    """Build a wav/opus variant from the raw 16-bit little-endian PCM master"""
+    samples = np.frombuffer(pcm_bytes[:len(pcm_bytes) - (len(pcm_bytes) % 2)], dtype="<i2")
+    out = io.BytesIO()
+    if variant.format == "wav":
+        sf.write(out, samples, variant.sample_rate, format="WAV", subtype="PCM_16")
+    elif variant.format == "opus":
+        sf.write(
+            out,
+            samples.astype("float32") / 32768.0,
+            variant.sample_rate,
+            format="OGG",
+            subtype="OPUS",
+            compression_level=variant.compression_level,
+        )
+    else:
+        raise ValueError(f"{variant.format} is not derived from PCM")
+    return out.getvalue()
+
+
+# ------------------ Encoded variant cache ------------------
+class AudioVariantCache:
+    """
+    Byte-budgeted LRU of synthesized audio, one entry per (voice, model, text, variant).
+    PCM masters are cached too, so a text first requested as mp3 and later as opus costs
+    two provider calls at most, and derived formats at the same sample rate share one.
+    Also keeps per-format serving counters for tuning defaults.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl_seconds=3600):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, audio)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.served = {}  # "format:tier" -> {"requests", "bytes", "cache_hits"}
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, audio = entry
+            if now >= expires_at:
+                del self._entries[key]
+                self._bytes -= len(audio)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return audio
+
+    def put(self, key, audio: bytes):
+        if not audio or len(audio) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, audio)
+            self._bytes += len(audio)
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._bytes -= len(dropped)
+                self.evictions += 1
+
+    def record_served(self, variant_key: str, n_bytes: int, cache_hit: bool):
+        with self._lock:
+            counters = self.served.setdefault(variant_key, {"requests": 0, "bytes": 0, "cache_hits": 0})
+            counters["requests"] += 1
+            counters["bytes"] += n_bytes
+            if cache_hit:
+                counters["cache_hits"] += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            served = {k: dict(v) for k, v in self.served.items()}
+        return {
+            "entries": len(self._entries),
+            "bytes_cached": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "served": served,
+        }
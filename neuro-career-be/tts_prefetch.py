@@ -0,0 +1,96 @@
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict
+
+
+class PrefetchSlot:
+    def __init__(self, text, variant_key, task):
+        self.text = text
+        self.variant_key = variant_key
+        self.task = task
+        self.created = time.monotonic()
+
+
+# ------------------ TTS prefetch ------------------
+class TTSPrefetcher:
+    """
+    One short-lived slot per session holding the speech synthesis of the latest chat reply.
+
+    chat() starts the synthesis as soon as the reply text exists; the client's following
+    /api/text-to-speech request for the same text and variant claims the slot and gets the
+    finished audio, or awaits the synthesis that is still running. A newer reply replaces
+    the slot, and unclaimed slots expire after ttl_seconds (their audio still lands in the
+    variant cache). Runs on the event loop only, so no locking.
+    """
+
+    def __init__(self, ttl_seconds=30, max_sessions=500):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._slots = OrderedDict()  # session_id -> PrefetchSlot
+
+        self.started = 0
+        self.claimed_ready = 0
+        self.claimed_in_flight = 0
+        self.claimed_failed = 0
+        self.misses = 0
+        self.expired = 0
+        self.replaced = 0
+        self.failed = 0
+
+    def _purge(self, now):
+        while self._slots:
+            session_id, slot = next(iter(self._slots.items()))
+            if now - slot.created < self.ttl_seconds and len(self._slots) <= self.max_sessions:
+                break
+            del self._slots[session_id]
+            self.expired += 1
+
+    def _on_done(self, task):
+        # retrieve the outcome so unclaimed failures don't log "exception was never retrieved"
+        if not task.cancelled() and task.exception() is not None:
+            self.failed += 1
+
+    def start(self, session_id, text, variant_key, synthesize):
+        """Begin synthesize() (a coroutine function) in the background and park it for session_id"""
+        now = time.monotonic()
+        self._purge(now)
+        if session_id in self._slots:
+            self.replaced += 1
+        # a fresh context: the chat request's trace is finished by the time this completes
+        task = asyncio.get_running_loop().create_task(synthesize(), context=contextvars.Context())
+        task.add_done_callback(self._on_done)
+        self._slots[session_id] = PrefetchSlot(text, variant_key, task)
+        self._slots.move_to_end(session_id)
+        self.started += 1
+
+    def claim(self, session_id, text, variant_key):
+        """Take the session's prefetch if it matches text and variant; returns the task or None"""
+        self._purge(time.monotonic())
+        slot = self._slots.get(session_id)
+        if slot is None or slot.text != text or slot.variant_key != variant_key:
+            self.misses += 1
+            return None
+        del self._slots[session_id]
+        if slot.task.done() and (slot.task.cancelled() or slot.task.exception() is not None):
+            self.claimed_failed += 1
+        elif slot.task.done():
+            self.claimed_ready += 1
+        else:
+            self.claimed_in_flight += 1
+        return slot.task
+
+    def stats(self) -> dict:
+        claimed = self.claimed_ready + self.claimed_in_flight
+        return {
+            "slots": len(self._slots),
+            "started": self.started,
+            "claimed_ready": self.claimed_ready,
+            "claimed_in_flight": self.claimed_in_flight,
+            "claimed_failed": self.claimed_failed,
+            "claim_rate": round(claimed / self.started, 4) if self.started else 0.0,
+            "misses": self.misses,
+            "expired": self.expired,
+            "replaced": self.replaced,
+            "failed": self.failed,
+        }